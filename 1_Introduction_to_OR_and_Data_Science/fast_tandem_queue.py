@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import heapq
+import numpy as np
+
+# A fast way of simulating simple queueing systems, without SimPy.
+#
+# When every patient goes through the same queues in the same order (a
+# "tandem" of queues), each queue is first come first served, and patients
+# let go of one resource before they queue for the next (as in
+# how_long_spend_ed.py), we don't need to schedule any events at all.  If we
+# know when each patient arrives at a queue, and how long each patient will
+# spend being served, we can work out when each patient is seen directly :
+#   - With one server, a patient waits for whatever's left of the wait and
+#     service time of the patient in front, once we take off the gap between
+#     them arriving.  This is the Lindley recursion, and we can work it out
+#     for every patient at once with NumPy (see single_server_queue_times).
+#   - With several servers, a patient is seen by whichever server is free
+#     first (or straight away if one's already free).  We keep the times each
+#     server will next be free in a heap, so the next free server is always
+#     on top (the Kiefer-Wolfowitz recursion).  This needs a simple loop over
+#     the patients, but there's still nothing to schedule.
+# The times patients leave one queue are the times they arrive at the next.
+#
+# This is only right for models with that structure - if patients have
+# priorities, give up waiting, hold on to one resource whilst waiting for the
+# next, or take different routes, use the SimPy model.
+
+# Function to work out the queuing times for a single server queue, given the
+# arrival times (in order) and service times of each patient.  If we call the
+# service time of the patient in front minus the gap between their arrivals
+# the "extra wait", a patient's wait is the running total of extra waits, less
+# the lowest that running total has been so far (the wait is reset to 0
+# every time the queue empties).
+def single_server_queue_times(arrival_times, service_times):
+    extra_waits = np.empty(len(arrival_times))
+    extra_waits[0] = 0.0
+    extra_waits[1:] = service_times[:-1] - np.diff(arrival_times)
+
+    running_total = np.cumsum(extra_waits)
+
+    return running_total - np.minimum.accumulate(running_total)
+
+# Function to work out the queuing times for a queue with several servers,
+# given the arrival times (in order) and service times of each patient
+def multi_server_queue_times(arrival_times, service_times, servers):
+    # The time each server is next free - all free at the start
+    server_free_times = [float("-inf")] * servers
+
+    queue_times = []
+
+    # Plain Python floats and lists are much quicker than NumPy for a loop
+    # like this one
+    for arrival_time, service_time in zip(arrival_times.tolist(),
+                                          service_times.tolist()):
+        next_free_time = server_free_times[0]
+
+        if next_free_time > arrival_time:
+            start_time = next_free_time
+        else:
+            start_time = arrival_time
+
+        queue_times.append(start_time - arrival_time)
+
+        # Replace the server we've just used with the time it'll next be free
+        heapq.heapreplace(server_free_times, start_time + service_time)
+
+    return np.array(queue_times)
+
+# Function to work out the queuing times, and the times patients finish being
+# served, for a first come first served queue with any number of servers.
+# The arrival times don't need to be in order - they're put in order first,
+# and the results are given back in the same order as the patients we passed
+# in.
+def fifo_queue(arrival_times, service_times, servers=1):
+    order = np.argsort(arrival_times, kind="stable")
+    sorted_arrival_times = arrival_times[order]
+    sorted_service_times = service_times[order]
+
+    if servers == 1:
+        sorted_queue_times = single_server_queue_times(sorted_arrival_times,
+                                                       sorted_service_times)
+    else:
+        sorted_queue_times = multi_server_queue_times(sorted_arrival_times,
+                                                      sorted_service_times,
+                                                      servers)
+
+    queue_times = np.empty(len(arrival_times))
+    queue_times[order] = sorted_queue_times
+
+    return queue_times, arrival_times + queue_times + service_times
+
+# Function to simulate a tandem of first come first served queues.  We give
+# it the time each patient arrives, and a list of stations - one for each
+# queue, in the order patients go through them - each given as the service
+# time for each patient at that station and the number of servers.  We get
+# back a list of the queuing times of each patient at each station, and the
+# time each patient leaves the last station.
+def simulate_tandem_queue(arrival_times, stations):
+    list_of_queue_times = []
+    station_arrival_times = arrival_times
+
+    for service_times, servers in stations:
+        queue_times, departure_times = fifo_queue(station_arrival_times,
+                                                  service_times, servers)
+
+        list_of_queue_times.append(queue_times)
+        station_arrival_times = departure_times
+
+    return list_of_queue_times, station_arrival_times
+
+# Function to run a fast version of the ED model in how_long_spend_ed.py
+# (registration, then triage, then treatment), taking the same parameters.
+# We give back a dictionary of NumPy arrays with the same names as the
+# collectors in run_ed_simulation, holding every patient's time.  As in the
+# SimPy model, a queuing time is only counted if the patient got to the front
+# of the queue before the end of the run, and a time in system only if they
+# left before the end of the run.
+def run_fast_ed_simulation(run_duration=525600, mean_interarrival_time=8,
+                           mean_registration_time=2, mean_triage_time=5,
+                           mean_treatment_time=30, number_of_receptionists=1,
+                           number_of_triage_nurses=2, number_of_cubicles=4,
+                           seed=None):
+    rng = np.random.default_rng(seed)
+
+    # Sample the arrival times.  We sample a few more than we expect to
+    # need, and keep going if that wasn't enough.
+    expected_arrivals = run_duration / mean_interarrival_time
+    number_to_sample = int(expected_arrivals + 5 * np.sqrt(expected_arrivals)
+                           + 10)
+    arrival_times = np.cumsum(rng.exponential(mean_interarrival_time,
+                                              number_to_sample))
+
+    while arrival_times[-1] < run_duration:
+        arrival_times = np.concatenate([
+            arrival_times, arrival_times[-1] + np.cumsum(rng.exponential(
+                mean_interarrival_time, number_to_sample))])
+
+    # The first patient in the SimPy model arrives at time 0
+    arrival_times = np.concatenate([[0.0], arrival_times])
+    arrival_times = arrival_times[arrival_times < run_duration]
+
+    number_of_patients = len(arrival_times)
+
+    stations = [(rng.exponential(mean_registration_time, number_of_patients),
+                 number_of_receptionists),
+                (rng.exponential(mean_triage_time, number_of_patients),
+                 number_of_triage_nurses),
+                (rng.exponential(mean_treatment_time, number_of_patients),
+                 number_of_cubicles)]
+
+    list_of_queue_times, departure_times = simulate_tandem_queue(
+        arrival_times, stations)
+
+    results = {}
+    station_arrival_times = arrival_times
+
+    for name, queue_times, (service_times, servers) in zip(
+            ["q_recep", "q_triage", "q_treat"], list_of_queue_times,
+            stations):
+        seen_times = station_arrival_times + queue_times
+        results[name] = queue_times[seen_times < run_duration]
+        station_arrival_times = seen_times + service_times
+
+    results["system_time"] = (departure_times - arrival_times)[
+        departure_times < run_duration]
+
+    return results
+
+# Check the fast version against the SimPy version of the ED model.  We run
+# each for the same number of simulated years, and compare the mean and 95th
+# percentile of each queuing time, along with how long each took.  The two
+# versions use different random numbers, so the results won't be identical,
+# but they should be close.
+if __name__ == "__main__":
+    import random
+    import time
+    from how_long_spend_ed import run_ed_simulation
+
+    years = 5
+    run_duration = years * 525600
+
+    random.seed(42)
+    start_time = time.perf_counter()
+    simpy_stats = run_ed_simulation(run_duration=run_duration)
+    simpy_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    fast_results = run_fast_ed_simulation(run_duration=run_duration,
+                                          seed=42)
+    fast_time = time.perf_counter() - start_time
+
+    print ("Simulating ", years, " years - SimPy : ", round(simpy_time, 2),
+           "s, fast : ", round(fast_time, 3), "s (", round(simpy_time /
+           fast_time), "x quicker)", sep="")
+    print ()
+    print ("{:<12}{:>12}{:>12}{:>12}{:>12}".format(
+        "", "SimPy mean", "Fast mean", "SimPy 95th", "Fast 95th"))
+
+    for name in ["q_recep", "q_triage", "q_treat", "system_time"]:
+        print ("{:<12}{:>12.2f}{:>12.2f}{:>12.2f}{:>12.2f}".format(
+            name, simpy_stats[name].mean, fast_results[name].mean(),
+            simpy_stats[name].quantile(0.95),
+            np.quantile(fast_results[name], 0.95)))
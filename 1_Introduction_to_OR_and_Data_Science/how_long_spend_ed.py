@@ -8,17 +8,18 @@ Created on Tue Oct 29 11:54:44 2019
 
 import simpy
 import random
+from streaming_statistics import Streaming_Statistics
 
 # Our patient arrivals generator
 def arrival_generator(env, mean_interarrival_time, receptionist, triage_nurse,\
                       treatment_cubicle, mean_registration_time, \
-                      mean_triage_time, mean_treatment_time):
+                      mean_triage_time, mean_treatment_time, stats):
     # Keep generating until the simulation finishes
     while True:
         # Create a new patient with the necessary attributes
         p = ed_patient(env, receptionist, triage_nurse, treatment_cubicle, \
                        mean_registration_time, mean_triage_time, \
-                       mean_treatment_time)
+                       mean_treatment_time, stats)
         
         # Have the environment process the new patient (bring into being)
         env.process(p)
@@ -31,9 +32,11 @@ def arrival_generator(env, mean_interarrival_time, receptionist, triage_nurse,\
         # Activate the timeout
         yield env.timeout(t)
         
-# The function that defines the journey of an ED patient
+# The function that defines the journey of an ED patient.  The stats
+# dictionary holds the collectors for the queuing times and time in system
 def ed_patient(env, receptionist, triage_nurse, treatment_cubicle, \
-               mean_registration_time, mean_triage_time, mean_treatment_time):
+               mean_registration_time, mean_triage_time, mean_treatment_time, \
+               stats):
     # Patient enters queue for receptionist
     # Record the time the patient entered the queue
     time_ent_q_for_recep = env.now
@@ -50,8 +53,8 @@ def ed_patient(env, receptionist, triage_nurse, treatment_cubicle, \
         time_left_q_for_recep = env.now
         
         # Calcuate the time spent in the queue for the receptionist and add
-        # to the list of queuing times
-        list_of_q_recep.append(time_left_q_for_recep - time_ent_q_for_recep)
+        # to the queuing time statistics
+        stats["q_recep"].add(time_left_q_for_recep - time_ent_q_for_recep)
         
         # Randomly sample time patient spends with receptionist
         time_with_recep = random.expovariate(1.0 / mean_registration_time)
@@ -72,8 +75,8 @@ def ed_patient(env, receptionist, triage_nurse, treatment_cubicle, \
         time_left_q_for_triage = env.now
         
         # Calculate the time spent in the queue for the triage nurse and add
-        # to the list of queuing times
-        list_of_q_triage.append(time_left_q_for_triage - time_ent_q_for_triage)
+        # to the queuing time statistics
+        stats["q_triage"].add(time_left_q_for_triage - time_ent_q_for_triage)
         
         # Randomly sample time patient spends with triage nurse
         time_in_triage = random.expovariate(1.0 / mean_triage_time)
@@ -94,8 +97,8 @@ def ed_patient(env, receptionist, triage_nurse, treatment_cubicle, \
         time_left_q_for_treat = env.now
         
         # Calculate the time spent in the queue for treatment and add
-        # to the list of queuing times
-        list_of_q_treat.append(time_left_q_for_treat - time_ent_q_for_treat)
+        # to the queuing time statistics
+        stats["q_treat"].add(time_left_q_for_treat - time_ent_q_for_treat)
         
         # Randomly sample time patient spends in treatment cubicle
         time_in_treatment = random.expovariate(1.0 / mean_treatment_time)
@@ -106,56 +109,85 @@ def ed_patient(env, receptionist, triage_nurse, treatment_cubicle, \
     # Record the time the patient left the system
     time_left_system = env.now
     
-    # Calculate the total time the patient was in the system and append it
-    # to the list of times in system
-    list_of_system_times.append(time_left_system - time_ent_system)
+    # Calculate the total time the patient was in the system and add it to
+    # the time in system statistics
+    stats["system_time"].add(time_left_system - time_ent_system)
     
-# Set up environment
-env = simpy.Environment()
-
-# Set up resources
-receptionist = simpy.Resource(env, capacity=1)
-triage_nurse = simpy.Resource(env, capacity=2) # base = 2
-treatment_cubicle = simpy.Resource(env, capacity=4) # base = 4
-
-# Specify distribution parameters
-mean_interarrival_time = 8
-mean_registration_time = 2
-mean_triage_time = 5
-mean_treatment_time = 30
-
-# Set up lists of queuing times
-list_of_q_recep = []
-list_of_q_triage = []
-list_of_q_treat = []
-list_of_system_times = []
-
-# Launch the patient generator
-env.process(arrival_generator(env, mean_interarrival_time, receptionist,\
-                              triage_nurse, treatment_cubicle, \
-                              mean_registration_time, mean_triage_time, \
-                              mean_treatment_time))
-
-# Run the simulation for one year (525,600 minutes)
-env.run(until=525600)
-
-# Calculate the average queuing time for each activity
-mean_queuing_time_reception = sum(list_of_q_recep) / len(list_of_q_recep)
-mean_queuing_time_triage_nurse = sum(list_of_q_triage) / len(list_of_q_triage)
-mean_queuing_time_treatment = sum(list_of_q_treat) / len(list_of_q_treat)
-
-# Print the average queuing time results
-print ("Average queuing time for reception : ", \
-       round(mean_queuing_time_reception, 2), " minutes.", sep="")
-print ("Average queuing time for triage    : ", \
-       round(mean_queuing_time_triage_nurse, 2), " minutes.", sep="")
-print ("Average queuing time for treatment : ", \
-       round(mean_queuing_time_treatment, 2), " minutes.", sep="")
-
-# Calculate the average time in system across patients
-mean_time_in_system = sum(list_of_system_times) / len(list_of_system_times)
-
-# Print the average time in system results
-print ("Average time in system : ", round(mean_time_in_system, 2),\
-       " minutes.", sep="")
+# Function to set up and run the simulation.  By default it uses the values
+# we've been using all along, and runs for one year (525,600 minutes), but we
+# can pass in different values (eg to see what happens with more patients).
+# It gives back the dictionary of collectors for the queuing times and time in
+# system
+def run_ed_simulation(run_duration=525600, mean_interarrival_time=8, \
+                      mean_registration_time=2, mean_triage_time=5, \
+                      mean_treatment_time=30, number_of_receptionists=1, \
+                      number_of_triage_nurses=2, number_of_cubicles=4, \
+                      keep_full_trace=False):
+    # Set up environment
+    env = simpy.Environment()
+    
+    # Set up resources
+    receptionist = simpy.Resource(env, capacity=number_of_receptionists)
+    triage_nurse = simpy.Resource(env, capacity=number_of_triage_nurses)
+    treatment_cubicle = simpy.Resource(env, capacity=number_of_cubicles)
+    
+    # Set up collectors for the queuing times and times in system.  Rather
+    # than keeping a list of every patient's time (which gets very long over a
+    # year), these keep a running mean, min, max and percentiles as we go.  Set
+    # keep_full_trace to True if you want every patient's time kept as well
+    # (in the trace attribute of each collector)
+    stats = {"q_recep":Streaming_Statistics(keep_trace=keep_full_trace),
+             "q_triage":Streaming_Statistics(keep_trace=keep_full_trace),
+             "q_treat":Streaming_Statistics(keep_trace=keep_full_trace),
+             "system_time":Streaming_Statistics(keep_trace=keep_full_trace)}
+    
+    # Launch the patient generator
+    env.process(arrival_generator(env, mean_interarrival_time, receptionist,\
+                                  triage_nurse, treatment_cubicle, \
+                                  mean_registration_time, mean_triage_time, \
+                                  mean_treatment_time, stats))
+    
+    # Run the simulation
+    env.run(until=run_duration)
+    
+    return stats
 
+# Only run the simulation and print the results if we're running this file
+# directly (rather than importing the functions above into another file)
+if __name__ == "__main__":
+    # Run the simulation with 1 receptionist, 2 triage nurses (base = 2) and
+    # 4 treatment cubicles (base = 4), for one year (525,600 minutes)
+    stats = run_ed_simulation()
+    q_recep_stats = stats["q_recep"]
+    q_triage_stats = stats["q_triage"]
+    q_treat_stats = stats["q_treat"]
+    system_time_stats = stats["system_time"]
+    
+    # Grab the average queuing time for each activity
+    mean_queuing_time_reception = q_recep_stats.mean
+    mean_queuing_time_triage_nurse = q_triage_stats.mean
+    mean_queuing_time_treatment = q_treat_stats.mean
+    
+    # Print the average queuing time results
+    print ("Average queuing time for reception : ", \
+           round(mean_queuing_time_reception, 2), " minutes.", sep="")
+    print ("Average queuing time for triage    : ", \
+           round(mean_queuing_time_triage_nurse, 2), " minutes.", sep="")
+    print ("Average queuing time for treatment : ", \
+           round(mean_queuing_time_treatment, 2), " minutes.", sep="")
+    
+    # Grab the average time in system across patients
+    mean_time_in_system = system_time_stats.mean
+    
+    # Print the average time in system results
+    print ("Average time in system : ", round(mean_time_in_system, 2),\
+           " minutes.", sep="")
+    
+    # Print the 95th percentile of the queuing times too - 95% of patients
+    # queued for less than this
+    print ("95th percentile queuing time for reception : ", \
+           round(q_recep_stats.quantile(0.95), 2), " minutes.", sep="")
+    print ("95th percentile queuing time for triage    : ", \
+           round(q_triage_stats.quantile(0.95), 2), " minutes.", sep="")
+    print ("95th percentile queuing time for treatment : ", \
+           round(q_treat_stats.quantile(0.95), 2), " minutes.", sep="")
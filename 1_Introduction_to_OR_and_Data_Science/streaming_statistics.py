@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import math
+
+# Class to estimate a single quantile (eg the median, or the 95th percentile)
+# of a stream of values without storing them, using the P-squared (P²)
+# algorithm of Jain and Chlamtac (1985).  It keeps track of just five
+# "markers" - the minimum, the maximum, the quantile we want, and two points
+# either side of it - and nudges their heights along a curve as each new
+# value comes in.  So it uses the same (tiny) amount of memory however many
+# values we give it.
+class P2_Quantile:
+    def __init__(self, p):
+        self.p = p
+        self.count = 0
+
+        # Heights of the five markers (the first five values, until we have
+        # five values, after which they're our estimates)
+        self.heights = []
+
+        # Actual and desired positions of the markers, and how much the
+        # desired positions move each time a new value comes in
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired_positions = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, value):
+        self.count += 1
+        heights = self.heights
+
+        # Until we've seen five values, just store them
+        if len(heights) < 5:
+            heights.append(value)
+            heights.sort()
+            return
+
+        positions = self.positions
+
+        # Find which cell the new value falls in, extending the minimum or
+        # maximum if it's outside what we've seen before
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = 0
+            while value >= heights[cell + 1]:
+                cell += 1
+
+        # Every marker above that cell moves up one position
+        for i in range(cell + 1, 5):
+            positions[i] += 1
+
+        for i in range(5):
+            self.desired_positions[i] += self.increments[i]
+
+        # Adjust the heights of the three middle markers if they're now too
+        # far from where they should be
+        for i in range(1, 4):
+            distance = self.desired_positions[i] - positions[i]
+
+            if ((distance >= 1 and positions[i + 1] - positions[i] > 1) or
+                    (distance <= -1 and positions[i - 1] - positions[i] < -1)):
+                step = 1 if distance > 0 else -1
+
+                new_height = self.parabolic_height(i, step)
+
+                if heights[i - 1] < new_height < heights[i + 1]:
+                    heights[i] = new_height
+                else:
+                    heights[i] = self.linear_height(i, step)
+
+                positions[i] += step
+
+    # Piecewise-parabolic prediction of where marker i's height should move
+    def parabolic_height(self, i, step):
+        heights = self.heights
+        positions = self.positions
+
+        return heights[i] + step / (positions[i + 1] - positions[i - 1]) * (
+            (positions[i] - positions[i - 1] + step) *
+            (heights[i + 1] - heights[i]) /
+            (positions[i + 1] - positions[i]) +
+            (positions[i + 1] - positions[i] - step) *
+            (heights[i] - heights[i - 1]) /
+            (positions[i] - positions[i - 1]))
+
+    # Linear prediction, used if the parabolic one would put the markers out
+    # of order
+    def linear_height(self, i, step):
+        heights = self.heights
+        positions = self.positions
+
+        return heights[i] + step * (heights[i + step] - heights[i]) / (
+            positions[i + step] - positions[i])
+
+    # The current estimate of the quantile.  Up to five values, we've still
+    # got all of them, so we can just work it out exactly.
+    def value(self):
+        if self.count == 0:
+            return float("nan")
+
+        if self.count > 5:
+            return self.heights[2]
+
+        return self.heights[round(self.p * (self.count - 1))]
+
+# Class to collect summary statistics for a stream of values (eg the queuing
+# times for a resource) as they happen, without storing every value.  It keeps
+# a count, the minimum and maximum, a running mean and variance (using
+# Welford's method) and P² estimates of some quantiles, so it uses the same
+# amount of memory whether we simulate a day or a decade.  If we do want every
+# value (eg to plot them), we can switch on keep_trace, and the values will
+# also be stored in the trace list.  Until the first value comes in, the
+# mean, minimum and maximum are NaN, so a collector with no values (eg
+# nobody got through a queue) can't be mistaken for one with a mean of 0.
+class Streaming_Statistics:
+    def __init__(self, quantiles=(0.5, 0.9, 0.95), keep_trace=False):
+        self.count = 0
+        self.mean = float("nan")
+        self.sum_of_squared_differences = 0.0
+        self.minimum = float("nan")
+        self.maximum = float("nan")
+
+        self.quantile_estimators = {p:P2_Quantile(p) for p in quantiles}
+
+        self.keep_trace = keep_trace
+        self.trace = []
+
+    def add(self, value):
+        self.count += 1
+
+        if self.count == 1:
+            self.mean = value
+            self.minimum = value
+            self.maximum = value
+        else:
+            difference_from_old_mean = value - self.mean
+            self.mean += difference_from_old_mean / self.count
+            self.sum_of_squared_differences += (difference_from_old_mean *
+                                                (value - self.mean))
+
+            if value < self.minimum:
+                self.minimum = value
+            if value > self.maximum:
+                self.maximum = value
+
+        for estimator in self.quantile_estimators.values():
+            estimator.add(value)
+
+        if self.keep_trace:
+            self.trace.append(value)
+
+    # The sample variance (dividing by count - 1)
+    def variance(self):
+        if self.count < 2:
+            return float("nan")
+
+        return self.sum_of_squared_differences / (self.count - 1)
+
+    def standard_deviation(self):
+        return math.sqrt(self.variance())
+
+    # The estimate of one of the quantiles we asked for when we set up the
+    # collector, eg quantile(0.95) for the 95th percentile
+    def quantile(self, p):
+        return self.quantile_estimators[p].value()
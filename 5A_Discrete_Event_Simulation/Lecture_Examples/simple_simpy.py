@@ -9,6 +9,33 @@ Created on Tue Aug 11 15:34:30 2020
 
 import simpy
 import random
+import logging
+import sys
+
+# Rather than printing what's happening to each patient straight to the
+# screen, we send it to a logger (at the DEBUG level).  When we run this file
+# directly (see the bottom of the file), we switch the DEBUG messages on, so
+# we see them just as if we'd printed them.  If we import the functions into
+# another file to do lots of runs, they're switched off, and as we give the
+# logger the message and the values separately, it doesn't even build the
+# messages - so the runs don't slow down.  This logger sits under
+# "simpy_models" - the same logger all of the SimPy models use (see
+# simulation_logger.py in 5C).
+logger = logging.getLogger("simpy_models.simple_simpy")
+
+# Function to switch on the models' log messages at the level we give, shown
+# on the screen just as if they'd been printed
+def switch_on_logging(level=logging.DEBUG):
+    models_logger = logging.getLogger("simpy_models")
+
+    if models_logger.handlers:
+        return
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+
+    models_logger.addHandler(handler)
+    models_logger.setLevel(level)
 
 # Generator function for our patient generator (that will bring new patients
 # into the model).  We pass into the function the simulation environment along
@@ -55,11 +82,10 @@ def patient_generator_weight_loss(env, wl_inter, mean_consult, nurse):
 def activity_generator_weight_loss(env, mean_consult, nurse, p_id):
     # We can use the 'now' attribute of the simulation environment to grab
     # the current simulation time.  Which is useful for recording when a
-    # patient joined a queue for example.  Here, we also print it out for the
-    # user.
+    # patient joined a queue for example.  Here, we also log it for the user.
     time_entered_queue_for_nurse = env.now
-    print ("Patient ", p_id, " entered queue at ", 
-           time_entered_queue_for_nurse, sep="")
+    logger.debug("Patient %s entered queue at %s", p_id,
+                 time_entered_queue_for_nurse)
     
     # We now call the request() function of the Nurse resource, and we use a
     # 'with' statement to indicate that all of the code in the indented block
@@ -77,12 +103,12 @@ def activity_generator_weight_loss(env, mean_consult, nurse, p_id):
         # the current simulation time, and therefore work out how long the
         # patient was queuing.
         time_left_queue_for_nurse = env.now
-        print ("Patient ", p_id, " left queue at ", time_left_queue_for_nurse, 
-               sep="")
+        logger.debug("Patient %s left queue at %s", p_id,
+                     time_left_queue_for_nurse)
         time_in_queue_for_nurse = (time_left_queue_for_nurse -
                                    time_entered_queue_for_nurse)
-        print ("Patient ", p_id, " queued for ", time_in_queue_for_nurse,
-               " minutes.", sep="")
+        logger.debug("Patient %s queued for %s minutes.", p_id,
+                     time_in_queue_for_nurse)
         
         # Now the patient is with the nurse, we need to calculate how long
         # they spend in their consultation.  Here, we'll randomly sample
@@ -96,34 +122,51 @@ def activity_generator_weight_loss(env, mean_consult, nurse, p_id):
         # statement)
         yield env.timeout(sampled_consultation_time)
         
-        # Let's print when the patient leaves the consultation
-        print ("***Patient ", p_id, " finished at ", env.now, sep="")
+        # Let's log when the patient leaves the consultation
+        logger.debug("***Patient %s finished at %s", p_id, env.now)
         
-# We defined the generator functions above.  Here's where we'll get everything
-# running
-# First we set up a new SimPy simulation environment
-env = simpy.Environment()
-
-# Then we'll create a new SimPy resource called "nurse".  We give it the
-# simulation environment in which it will live, and the capacity (number of
-# nurses available).  This allows us to change resource availability really
-# easily.
-nurse = simpy.Resource(env, capacity=1)
-
-# We'll set our model parameter values here.  In this case, the mean
-# inter-arrival time for patients coming in for the weight loss clinic, and
-# the mean time patients will spend in a consultation.  Remember - we're going
-# to sample randomly for each patient from distributions with these means.
-# We would also expect queues to start forming here, as people are, on
-# average, arriving about a minute quicker than the nurse, on average, gets
-# through a consultation.
-wl_inter = 5
-mean_consult = 6
-
-# Start up our patient generator function so we start creating patients
-env.process(patient_generator_weight_loss(env, wl_inter, mean_consult, nurse))
-
-# Set the simulation to run for 120 time units (representing minutes in our
-# model, so for 2 hours of simulated time)
-env.run(until=120)
+# We defined the generator functions above.  Here's a function that gets
+# everything set up and running.  We pass in how long to run the simulation
+# for, along with the parameter values, so we can easily try different values
+# (by default, it uses the values we've been using all along).
+def run_weight_loss_clinic(run_duration=120, wl_inter=5, mean_consult=6,
+                           number_of_nurses=1):
+    # First we set up a new SimPy simulation environment
+    env = simpy.Environment()
+    
+    # Then we'll create a new SimPy resource called "nurse".  We give it the
+    # simulation environment in which it will live, and the capacity (number
+    # of nurses available).  This allows us to change resource availability
+    # really easily.
+    nurse = simpy.Resource(env, capacity=number_of_nurses)
+    
+    # Start up our patient generator function so we start creating patients
+    env.process(patient_generator_weight_loss(env, wl_inter, mean_consult,
+                                              nurse))
+    
+    # Run the simulation for the time we passed in
+    env.run(until=run_duration)
+    
+    return env
 
+# Here's where we'll get everything running (we only do this if we're running
+# this file directly, rather than importing the functions above into another
+# file).
+if __name__ == "__main__":
+    # Switch on the DEBUG messages, so we can see what each patient is doing
+    # (each message is shown on its own, just like print would)
+    switch_on_logging(logging.DEBUG)
+    
+    # We'll set our model parameter values here.  In this case, the mean
+    # inter-arrival time for patients coming in for the weight loss clinic,
+    # and the mean time patients will spend in a consultation.  Remember -
+    # we're going to sample randomly for each patient from distributions with
+    # these means.  We would also expect queues to start forming here, as
+    # people are, on average, arriving about a minute quicker than the nurse,
+    # on average, gets through a consultation.
+    wl_inter = 5
+    mean_consult = 6
+    
+    # Set the simulation to run for 120 time units (representing minutes in
+    # our model, so for 2 hours of simulated time)
+    run_weight_loss_clinic(120, wl_inter, mean_consult)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from array import array
+import numpy as np
+import simpy
+
+# Class to record how the level of something (eg the number of district
+# nurse minutes left in a container) changes over a run, so we can ask
+# questions about it afterwards - eg the average number of minutes available,
+# or how long there were fewer than 60 minutes available.
+#
+# Rather than checking the level every so often (which would add lots of
+# extra events to the simulation, and miss any changes in between), we only
+# record the times at which the level changes, and what it changed to.  The
+# level stays the same between those times, so this is all we need to know
+# the level at any time (a "step function").  If the level changes more than
+# once at the same time, we only keep the last change.  The times and levels
+# are stored in compact arrays of numbers, so even tens of thousands of
+# changes in a run take up very little memory.
+class Level_Timeline:
+    def __init__(self, start_time, start_level):
+        self.times = array("d", [start_time])
+        self.levels = array("d", [start_level])
+
+    # A method to record the level at the given time (if it's changed)
+    def record(self, time, level):
+        if level == self.levels[-1]:
+            return
+
+        if time == self.times[-1]:
+            self.levels[-1] = level
+
+            # If the level's gone back to what it was before, drop the
+            # change altogether
+            if len(self.levels) > 1 and self.levels[-2] == level:
+                self.times.pop()
+                self.levels.pop()
+
+            return
+
+        self.times.append(time)
+        self.levels.append(level)
+
+    def number_of_changes(self):
+        return len(self.times) - 1
+
+    # A method to get how long the level stayed at each of its values between
+    # the start and end times we give (eg just the results collection period
+    # after the warm up).  We give back the durations and the levels.
+    def step_function(self, start, end):
+        times = np.array(self.times)
+        levels = np.array(self.levels)
+
+        step_edges = np.clip(np.append(times, end), start, end)
+
+        return np.diff(step_edges), levels
+
+    # The average level (over time) between the start and end times
+    def mean_level(self, start, end):
+        if end <= start:
+            return float("nan")
+
+        durations, levels = self.step_function(start, end)
+
+        return float(np.dot(durations, levels) / (end - start))
+
+    # The total time between the start and end times that the level was below
+    # the threshold
+    def time_below(self, threshold, start, end):
+        durations, levels = self.step_function(start, end)
+
+        return float(durations[levels < threshold].sum())
+
+# A SimPy Container that records its level in a Level_Timeline.  SimPy
+# changes the level in its _do_put (for a put) and _do_get (for a get)
+# methods, so we record the level after each of those.  These are only
+# called when something is put into or taken out of the container, so there
+# are no extra events.  The queries default to the whole run so far.
+class Monitored_Container(simpy.Container):
+    def __init__(self, env, capacity=float("inf"), init=0):
+        super().__init__(env, capacity, init)
+        self.timeline = Level_Timeline(env.now, init)
+
+    def _do_put(self, event):
+        result = super()._do_put(event)
+        self.timeline.record(self._env.now, self._level)
+
+        return result
+
+    def _do_get(self, event):
+        result = super()._do_get(event)
+        self.timeline.record(self._env.now, self._level)
+
+        return result
+
+    def mean_level(self, start=0, end=None):
+        if end is None:
+            end = self._env.now
+
+        return self.timeline.mean_level(start, end)
+
+    def time_below(self, threshold, start=0, end=None):
+        if end is None:
+            end = self._env.now
+
+        return self.timeline.time_below(threshold, start, end)
@@ -10,34 +10,85 @@ Created on Tue Aug 11 15:34:30 2020
 import simpy
 import random
 import csv
+from concurrent.futures import ProcessPoolExecutor
+import logging
+import sys
 from statistics import mean
 import pandas as pd
+from container_timeline import Monitored_Container
+
+# Rather than printing what's happening to each patient (which, over 100 runs,
+# takes far longer than the simulation itself), we send these messages to a
+# logger at the DEBUG level.  This logger sits under "simpy_models" - the same
+# logger all of the SimPy models use (see simulation_logger.py in 5C).  It's
+# switched off unless we switch it on, so the DEBUG messages are skipped -
+# and as we give the logger the message and the values separately, it doesn't
+# even build the message.  To see them, change log_level at the bottom of the
+# file to logging.DEBUG (and reduce the number of runs!)
+logger = logging.getLogger("simpy_models.simpy_8")
+
+# Function to switch on the models' log messages at the level we give, shown
+# on the screen just as if they'd been printed.  The runs are done in worker
+# processes, which don't know we've switched logging on here, so this is also
+# run in each worker when it starts.  A worker that's a copy of this process
+# (as on Linux) already has it switched on, so we leave that alone.
+def switch_on_logging(level=logging.DEBUG):
+    models_logger = logging.getLogger("simpy_models")
+
+    if models_logger.handlers:
+        return
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+
+    models_logger.addHandler(handler)
+    models_logger.setLevel(level)
+
+# Class to hold everything a single run of the model needs - its parameter
+# values, its own random number generator, and the list its queuing times
+# are collected in.  We used to keep the queuing times in a global list,
+# which was emptied at the start of each run.  That's fine when the runs
+# happen one after the other, but it stops us doing several runs at the same
+# time (eg one on each core of the computer), as they'd all be adding to the
+# same list.  Giving each run its own run context, and passing it to the
+# generator functions, keeps the runs completely separate.  Each run also
+# gets its own random number generator (started from the seed we give it)
+# rather than sharing Python's, so any run can be repeated on its own.
+class DN_Run_Context:
+    def __init__(self, seed=None, dn_inter=10, mean_visit=60):
+        self.rng = random.Random(seed)
+        
+        # Parameter values
+        self.dn_inter = dn_inter
+        self.mean_visit = mean_visit
+        
+        # List to store queuing times
+        self.list_of_queuing_times_dn = []
 
 # Arrivals generator function
-def patient_generator_dn(env, dn_inter, mean_visit, district_nurse):
+def patient_generator_dn(env, run_context, district_nurse):
     while True:        
-        p = activity_generator_dn(env, mean_visit, district_nurse)
+        p = activity_generator_dn(env, run_context, district_nurse)
         
         env.process(p)
         
-        t = random.expovariate(1.0 / dn_inter)
+        t = run_context.rng.expovariate(1.0 / run_context.dn_inter)
         
         yield env.timeout(t)
         
 # Activity Generator
-def activity_generator_dn(env, mean_visit, district_nurse):
-    global list_of_queuing_times_dn
-    global warm_up_period
-    
+def activity_generator_dn(env, run_context, district_nurse):
     time_entered_queue_for_dn = env.now
     
     # Calculate how much resource to take from the container; here, this is
     # the number of district nurse minutes to remove (ie the visit duration)
-    dn_mins_sampled = random.expovariate(1.0 / mean_visit)
+    dn_mins_sampled = run_context.rng.expovariate(1.0 /
+                                                  run_context.mean_visit)
     
     # We can use the level attribute of the container to find out the current
     # level of the container (how many hours in the pot here)
-    print ("DN mins available before request : ", district_nurse.level)
+    logger.debug("DN mins available before request : %s",
+                 district_nurse.level)
     
     # When we want to take some quantity from the container, we can use the
     # get() method of the Container class, passing it the number of units of
@@ -49,13 +100,14 @@ def activity_generator_dn(env, mean_visit, district_nurse):
     # generator function will just carry on regardless)
     yield district_nurse.get(dn_mins_sampled)
     
-    print ("DN mins available after request : ", district_nurse.level)
+    logger.debug("DN mins available after request : %s",
+                 district_nurse.level)
     
     # The patient has now left the queue as we've got the district nurse hours
     # at this point
     time_left_queue_for_dn = env.now
     time_queuing_for_dn = (time_left_queue_for_dn - time_entered_queue_for_dn)
-    list_of_queuing_times_dn.append(time_queuing_for_dn)
+    run_context.list_of_queuing_times_dn.append(time_queuing_for_dn)
     
     # Call the timeout for the length of the visit (obviously here that's the
     # same as the amount of resource we've taken from the container, but
@@ -67,20 +119,21 @@ def activity_generator_dn(env, mean_visit, district_nurse):
     # method of the container class.  Again we need to use the yield keyword.
     yield district_nurse.put(dn_mins_sampled)
 
-# Set up number of times to the run the simulation
-number_of_simulation_runs = 100
-
 # Specify the results collection and warm up period for each simulation run
 results_collection_period = 1440
 warm_up_period = 2880
 
-# Create a file to store the results of each run, and write the column headers
-with open("dn_results.csv", "w") as f:
-    writer = csv.writer(f, delimiter=",")
-    
-    writer.writerow(["Run", "Mean Q DN"])
+# We'll also look at how often the district nurses were running low on
+# minutes - here, how much of the time there were fewer than this many
+# minutes available
+low_minutes_threshold = 120
 
-for run in range(number_of_simulation_runs):
+# Function to do a single run of the model, with the given run number and
+# seed, giving back the list of results to write to file for the run.
+# Everything the run needs is set up in here (or in its run context), so
+# lots of these can be done at the same time.  It needs to be at the top
+# level of the file so it can be sent to the worker processes.
+def run_dn_model(run, seed):
     # Set up simulation environment
     env = simpy.Environment()
     
@@ -88,57 +141,108 @@ for run in range(number_of_simulation_runs):
     # the container, and the maximum capacity of the container.  Here, it
     # makes sense to keep these the same (if we've put back more district
     # nurse hours than we took then something's gone wrong!), but in some
-    # situations you may want your container to go above the initial level
-    district_nurse = simpy.Container(env, init=1000, capacity=1000)
-    
-    # Set up parameter values
-    dn_inter = 10
-    mean_visit = 60
+    # situations you may want your container to go above the initial level.
+    # We use a Monitored_Container (see container_timeline.py), which works
+    # just like a SimPy Container, but also records every change in its level
+    # (without adding any events to the simulation), so we can ask about the
+    # level over the run afterwards.
+    district_nurse = Monitored_Container(env, init=1000, capacity=1000)
     
-    # Set up list to store queuing times
-    list_of_queuing_times_dn = []
+    # Set up the run context, with the parameter values, the random number
+    # generator and the list to store queuing times for this run
+    run_context = DN_Run_Context(seed, dn_inter=10, mean_visit=60)
     
     # Start the arrivals generator
-    env.process(patient_generator_dn(env, dn_inter, mean_visit, 
-                                     district_nurse))
+    env.process(patient_generator_dn(env, run_context, district_nurse))
     
     # Run the simulation for the warm up period + the results collection period
     env.run(until=(results_collection_period + warm_up_period))
     
-    # Calculate and print average queuing time
-    mean_queuing_time_dn = mean(list_of_queuing_times_dn)
-    
-    print ("Mean queuing time for the district nurse (mins) : ",
-           mean_queuing_time_dn, sep="")
-    
-    # Set up list to write to file - here we'll store the run number alongside
-    # the mean queuing time for the nurse in that run
-    list_to_write = [run, mean_queuing_time_dn]
-    
-    # Store the run results to file.  We need to open in append mode ("a"),
-    # otherwise we'll overwrite the file each time.  That's why we set up the
-    # new file before the for loop, to start anew for each batch of runs
-    with open("dn_results.csv", "a") as f:
+    # Calculate average queuing time
+    mean_queuing_time_dn = mean(run_context.list_of_queuing_times_dn)
+    
+    # Work out the average number of district nurse minutes available, and
+    # the % of the time they were running low, over the results collection
+    # period (after the warm up)
+    end_of_run = warm_up_period + results_collection_period
+    mean_dn_mins_available = district_nurse.mean_level(warm_up_period,
+                                                       end_of_run)
+    percent_time_dn_mins_low = 100 * district_nurse.time_below(
+        low_minutes_threshold, warm_up_period, end_of_run) / (
+        results_collection_period)
+    
+    # Give back the list to write to file - here we'll store the run number
+    # alongside the mean queuing time for the nurse in that run, and the
+    # results for the minutes available
+    return [run, mean_queuing_time_dn, mean_dn_mins_available,
+            percent_time_dn_mins_low]
+
+# The code below only runs if we're running this file directly.  This is
+# needed because the worker processes that do the runs import this file to
+# find run_dn_model - we don't want each of them to start a trial of their
+# own!
+if __name__ == "__main__":
+    # The level of log messages to show (logging.DEBUG shows what's happening
+    # to each patient)
+    log_level = logging.WARNING
+    switch_on_logging(log_level)
+    
+    # Set up number of times to the run the simulation
+    number_of_simulation_runs = 100
+    
+    # Give each run its own seed.  Set base_seed to a number to get the same
+    # results every time we run the trial (None means different results each
+    # time)
+    base_seed = None
+    seed_generator = random.Random(base_seed)
+    run_seeds = [seed_generator.randrange(2 ** 32)
+                 for run in range(number_of_simulation_runs)]
+    
+    # Create a file to store the results of each run, and write the column
+    # headers
+    with open("dn_results.csv", "w") as f:
         writer = csv.writer(f, delimiter=",")
         
-        writer.writerow(list_to_write)
+        writer.writerow(["Run", "Mean Q DN", "Mean DN Mins Available",
+                         "% Time DN Mins Low"])
         
-# After the batch of runs is complete, we might want to read the results back
-# in and take some summary statistics
-# Here, we're going to use a neat shortcut for easily reading a csv file into
-# a pandas dataframe
-results_df = pd.read_csv("dn_results.csv")
-
-# We may want to take the average queuing time across runs
-mean_trial_queuing_time_dn = results_df["Mean Q DN"].mean()
-print ("Mean queuing time over trial : ", 
-       round(mean_trial_queuing_time_dn, 2))
-
-# Maybe the max and min run results too
-max_trial_queuing_time_dn = results_df["Mean Q DN"].max()
-min_trial_queuing_time_dn = results_df["Mean Q DN"].min()
-print ("Max mean queuing result over trial : ",
-       round(max_trial_queuing_time_dn, 2))
-print ("Min mean queuing result over trial : ", 
-       round(min_trial_queuing_time_dn, 2))
-
+        # Hand the runs out to a pool of worker processes (by default, one
+        # for each core of the computer), so several runs happen at once.
+        # The results come back in run order, and we write each one to the
+        # file as it comes in.
+        with ProcessPoolExecutor(initializer=switch_on_logging,
+                                 initargs=(log_level,)) as executor:
+            for list_to_write in executor.map(
+                    run_dn_model, range(number_of_simulation_runs),
+                    run_seeds):
+                print ("Mean queuing time for the district nurse (mins) : ",
+                       list_to_write[1], sep="")
+                
+                writer.writerow(list_to_write)
+            
+    # After the batch of runs is complete, we might want to read the results
+    # back in and take some summary statistics
+    # Here, we're going to use a neat shortcut for easily reading a csv file
+    # into a pandas dataframe
+    results_df = pd.read_csv("dn_results.csv")
+    
+    # We may want to take the average queuing time across runs
+    mean_trial_queuing_time_dn = results_df["Mean Q DN"].mean()
+    print ("Mean queuing time over trial : ", 
+           round(mean_trial_queuing_time_dn, 2))
+    
+    # Maybe the max and min run results too
+    max_trial_queuing_time_dn = results_df["Mean Q DN"].max()
+    min_trial_queuing_time_dn = results_df["Mean Q DN"].min()
+    print ("Max mean queuing result over trial : ",
+           round(max_trial_queuing_time_dn, 2))
+    print ("Min mean queuing result over trial : ", 
+           round(min_trial_queuing_time_dn, 2))
+    
+    # And the average number of district nurse minutes available, and how
+    # much of the time they were running low
+    print ("Mean DN mins available over trial : ",
+           round(results_df["Mean DN Mins Available"].mean(), 2))
+    print ("Mean % of time with fewer than ", low_minutes_threshold,
+           " DN mins available over trial : ",
+           round(results_df["% Time DN Mins Low"].mean(), 2), sep="")
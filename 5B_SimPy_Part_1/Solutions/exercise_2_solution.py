@@ -11,48 +11,70 @@ import simpy
 import random
 from statistics import mean
 import csv
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 
+# Class to hold everything a single run of the model needs - its parameter
+# values, its own random number generator, and the lists its results are
+# collected in.  Keeping these in global lists (emptied at the start of each
+# run) would stop us doing several runs at the same time, as they'd all be
+# adding to the same lists.  With a run context for each run, passed to the
+# generator functions, the runs are kept completely separate, so they can be
+# shared out over the cores of the computer.
+class GP_Run_Context:
+    def __init__(self, seed=None, gp_inter=3, call_inter=10, mean_register=2,
+                 mean_consult=8, mean_book_test=4, mean_call=4,
+                 warm_up_period=180):
+        self.rng = random.Random(seed)
+        
+        # Parameter values
+        self.gp_inter = gp_inter
+        self.call_inter = call_inter
+        self.mean_register = mean_register
+        self.mean_consult = mean_consult
+        self.mean_book_test = mean_book_test
+        self.mean_call = mean_call
+        self.warm_up_period = warm_up_period
+        
+        # Lists to store queuing times and time in system across patients
+        self.list_of_queuing_times_registration = []
+        self.list_of_queuing_times_consultation = []
+        self.list_of_queuing_times_book_test = []
+        self.list_of_times_in_system = []
+
 # Arrivals generator function
-def patient_generator_gp(env, gp_inter, mean_register, mean_consult,
-                         mean_book_test, receptionist, gp):
+def patient_generator_gp(env, run_context, receptionist, gp):
     while True:
-        p = activity_generator_gp(env, mean_register, mean_consult,
-                                  mean_book_test, receptionist, gp)
+        p = activity_generator_gp(env, run_context, receptionist, gp)
         
         env.process(p)
         
-        t = random.expovariate(1.0 / gp_inter)
+        t = run_context.rng.expovariate(1.0 / run_context.gp_inter)
         
         yield env.timeout(t)
         
 # Arrivals generator for telephone calls
-def call_generator_reception(env, call_inter, mean_call, receptionist):
+def call_generator_reception(env, run_context, receptionist):
     while True:
-        c = activity_generator_call(env, mean_call, receptionist)
+        c = activity_generator_call(env, run_context, receptionist)
         
         env.process(c)
         
-        t = random.expovariate(1.0 / call_inter)
+        t = run_context.rng.expovariate(1.0 / run_context.call_inter)
         
         yield env.timeout(t)
         
 # Activity generator for receptionist taking telephone calls
-def activity_generator_call(env, mean_call, receptionist):    
+def activity_generator_call(env, run_context, receptionist):    
     with receptionist.request() as req:
         yield req
         
-        sampled_call_time = random.expovariate(1.0 / mean_call)
+        sampled_call_time = run_context.rng.expovariate(
+            1.0 / run_context.mean_call)
         
         yield env.timeout(sampled_call_time)
         
-def activity_generator_gp(env, mean_register, mean_consult, mean_book_test,
-                          receptionist, gp):
-    global list_of_queuing_times_registration
-    global list_of_queuing_times_consultation
-    global list_of_queuing_times_book_test
-    global list_of_times_in_system
-    
+def activity_generator_gp(env, run_context, receptionist, gp):
     time_entered_system = env.now
     time_entered_queue_for_registration = env.now
     
@@ -62,11 +84,12 @@ def activity_generator_gp(env, mean_register, mean_consult, mean_book_test,
         time_left_queue_for_registration = env.now
         time_in_queue_for_registration = (time_left_queue_for_registration -
                                           time_entered_queue_for_registration)
-        if env.now > warm_up_period:
-            list_of_queuing_times_registration.append(
+        if env.now > run_context.warm_up_period:
+            run_context.list_of_queuing_times_registration.append(
                 time_in_queue_for_registration)
         
-        sampled_registration_time = random.expovariate(1.0 / mean_register)
+        sampled_registration_time = run_context.rng.expovariate(
+            1.0 / run_context.mean_register)
         
         yield env.timeout(sampled_registration_time)
     
@@ -78,15 +101,16 @@ def activity_generator_gp(env, mean_register, mean_consult, mean_book_test,
         time_left_queue_for_gp = env.now
         time_in_queue_for_gp = (time_left_queue_for_gp -
                                 time_entered_queue_for_gp)
-        if env.now > warm_up_period:
-            list_of_queuing_times_consultation.append(
+        if env.now > run_context.warm_up_period:
+            run_context.list_of_queuing_times_consultation.append(
                 time_in_queue_for_gp)
         
-        sampled_consult_time = random.expovariate(1.0 / mean_consult)
+        sampled_consult_time = run_context.rng.expovariate(
+            1.0 / run_context.mean_consult)
         
         yield env.timeout(sampled_consult_time)
         
-    decide_test_needed = random.uniform(0,1)
+    decide_test_needed = run_context.rng.uniform(0,1)
     
     if decide_test_needed < 0.25:
         time_entered_queue_for_book_test = env.now
@@ -97,29 +121,27 @@ def activity_generator_gp(env, mean_register, mean_consult, mean_book_test,
             time_left_queue_for_book_test = env.now
             time_in_queue_for_book_test = (time_left_queue_for_book_test -
                                            time_entered_queue_for_book_test)
-            if env.now > warm_up_period:
-                list_of_queuing_times_book_test.append(
+            if env.now > run_context.warm_up_period:
+                run_context.list_of_queuing_times_book_test.append(
                     time_in_queue_for_book_test)
             
-            sampled_book_test_time = random.expovariate(1.0 / mean_book_test)
+            sampled_book_test_time = run_context.rng.expovariate(
+                1.0 / run_context.mean_book_test)
             
             yield env.timeout(sampled_book_test_time)
             
     time_left_system = env.now
     time_in_system = (time_left_system - time_entered_system)
-    if env.now > warm_up_period:
-        list_of_times_in_system.append(time_in_system)
+    if env.now > run_context.warm_up_period:
+        run_context.list_of_times_in_system.append(time_in_system)
 
-number_of_runs = 100
 warm_up_period = 180
 results_collection_period = 480
 
-with open("ex_2_results.csv", "w") as f:
-    writer = csv.writer(f, delimiter=",")
-    
-    writer.writerow(["Run", "Q Reg", "Q Cons", "Q Book Test", "Time in Sys"])
-
-for run in range(number_of_runs):
+# Function to do a single run of the model, giving back the list of results
+# to write to file for the run.  It needs to be at the top level of the file
+# so it can be sent to the worker processes.
+def run_gp_model(run, seed):
     # Set up simulation environment
     env = simpy.Environment()
     
@@ -127,63 +149,77 @@ for run in range(number_of_runs):
     receptionist = simpy.Resource(env, capacity=1)
     gp = simpy.Resource(env, capacity=2)
     
-    # Set up parameter values
-    gp_inter = 3
-    call_inter = 10
-    mean_register = 2
-    mean_consult = 8
-    mean_book_test = 4
-    mean_call = 4
-    
-    # Lists to store queuing times and time in system across patients
-    list_of_queuing_times_registration = []
-    list_of_queuing_times_consultation = []
-    list_of_queuing_times_book_test = []
-    list_of_times_in_system = []
+    # Set up the run context, with the parameter values, the random number
+    # generator and the lists to store queuing times and time in system
+    run_context = GP_Run_Context(seed, gp_inter=3, call_inter=10,
+                                 mean_register=2, mean_consult=8,
+                                 mean_book_test=4, mean_call=4,
+                                 warm_up_period=warm_up_period)
     
     # Start the arrivals generators (in person and incoming calls)
-    env.process(patient_generator_gp(env, gp_inter, mean_register, 
-                                     mean_consult, mean_book_test, 
-                                     receptionist, gp))
-    env.process(call_generator_reception(env, call_inter, mean_call, 
-                                         receptionist))
+    env.process(patient_generator_gp(env, run_context, receptionist, gp))
+    env.process(call_generator_reception(env, run_context, receptionist))
     
     # Run the simulation
     env.run(until=(warm_up_period + results_collection_period))
     
-    # Calculate and print the mean queuing times for each queue and the mean
-    # time in system
-    mean_queue_time_registration = mean(list_of_queuing_times_registration)
-    mean_queue_time_consultation = mean(list_of_queuing_times_consultation)
-    mean_queue_time_book_test = mean(list_of_queuing_times_book_test)
-    mean_time_in_system = mean(list_of_times_in_system)
+    # Calculate the mean queuing times for each queue and the mean time in
+    # system
+    mean_queue_time_registration = mean(
+        run_context.list_of_queuing_times_registration)
+    mean_queue_time_consultation = mean(
+        run_context.list_of_queuing_times_consultation)
+    mean_queue_time_book_test = mean(
+        run_context.list_of_queuing_times_book_test)
+    mean_time_in_system = mean(run_context.list_of_times_in_system)
     
-    list_to_write = [run, 
-                     mean_queue_time_registration,
-                     mean_queue_time_consultation,
-                     mean_queue_time_book_test,
-                     mean_time_in_system]
+    return [run, 
+            mean_queue_time_registration,
+            mean_queue_time_consultation,
+            mean_queue_time_book_test,
+            mean_time_in_system]
 
-    with open("ex_2_results.csv", "a") as f:
+# Only run the trial if we're running this file directly (the worker processes
+# import this file to find run_gp_model, and we don't want each of them to
+# start a trial of their own)
+if __name__ == "__main__":
+    number_of_runs = 100
+    
+    # Give each run its own seed (set base_seed to a number to get the same
+    # results every time)
+    base_seed = None
+    seed_generator = random.Random(base_seed)
+    run_seeds = [seed_generator.randrange(2 ** 32)
+                 for run in range(number_of_runs)]
+    
+    with open("ex_2_results.csv", "w") as f:
         writer = csv.writer(f, delimiter=",")
         
-        writer.writerow(list_to_write)
+        writer.writerow(["Run", "Q Reg", "Q Cons", "Q Book Test",
+                         "Time in Sys"])
         
-results_df = pd.read_csv("ex_2_results.csv")
-
-mean_q_reg_trial = results_df["Q Reg"].mean()
-mean_q_con_trial = results_df["Q Cons"].mean()
-mean_q_book_trial = results_df["Q Book Test"].mean()
-mean_tis_trial = results_df["Time in Sys"].mean()
-
-print ("Trial Results")
-print ("-------------")
-print ("Mean time in queue for registration (mins) : ",
-       round(mean_q_reg_trial, 2))
-print ("Mean time in queue for consultation (mins) : ",
-       round(mean_q_con_trial, 2))
-print ("Mean time in queue for booking tests (mins) : ",
-       round(mean_q_book_trial, 2))
-print ("Mean time in system (mins) : ",
-       round(mean_tis_trial,2))
-
+        # Share the runs out over a pool of worker processes (one per core by
+        # default), and write the results of each run as they come back
+        with ProcessPoolExecutor() as executor:
+            for list_to_write in executor.map(run_gp_model,
+                                              range(number_of_runs),
+                                              run_seeds):
+                writer.writerow(list_to_write)
+            
+    results_df = pd.read_csv("ex_2_results.csv")
+    
+    mean_q_reg_trial = results_df["Q Reg"].mean()
+    mean_q_con_trial = results_df["Q Cons"].mean()
+    mean_q_book_trial = results_df["Q Book Test"].mean()
+    mean_tis_trial = results_df["Time in Sys"].mean()
+    
+    print ("Trial Results")
+    print ("-------------")
+    print ("Mean time in queue for registration (mins) : ",
+           round(mean_q_reg_trial, 2))
+    print ("Mean time in queue for consultation (mins) : ",
+           round(mean_q_con_trial, 2))
+    print ("Mean time in queue for booking tests (mins) : ",
+           round(mean_q_book_trial, 2))
+    print ("Mean time in system (mins) : ",
+           round(mean_tis_trial,2))
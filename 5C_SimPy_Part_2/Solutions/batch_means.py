@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import math
+import warnings
+import numpy as np
+import pandas as pd
+from scipy import stats
+from run_parameters import Run_Parameters
+
+# Function to split a series of values (in the order they happened) into a
+# number of equal sized batches, and give back the mean of each batch.  If
+# the values don't split exactly, the extra values at the start are left out
+# (they're the closest to the warm up, so the least useful).
+def batch_means(values, number_of_batches):
+    batch_size = len(values) // number_of_batches
+    values = values[len(values) - number_of_batches * batch_size:]
+
+    return values.reshape(number_of_batches, batch_size).mean(axis=1)
+
+# Function to work out the lag 1 autocorrelation of a series - how alike each
+# value is to the one before it (1 means each value is the same as the last,
+# 0 means there's no relationship at all)
+def lag_1_autocorrelation(values):
+    differences_from_mean = values - values.mean()
+    sum_of_squares = np.dot(differences_from_mean, differences_from_mean)
+
+    if sum_of_squares == 0:
+        return 0.0
+
+    return float(np.dot(differences_from_mean[:-1],
+                        differences_from_mean[1:]) / sum_of_squares)
+
+# Function to pick the number of batches to use for a series.  Patients'
+# queuing times are strongly related to those of the patients just before
+# them (if one patient waits a long time, so does the next), so the batches
+# need to be long enough that the batch means are (close to) independent of
+# each other - otherwise the confidence interval will be far too narrow.
+# We start with lots of small batches, and keep halving the number of
+# batches (doubling their size) until the lag 1 autocorrelation of the batch
+# means is no longer significantly above 0.  If we get down to the smallest
+# number of batches we'll allow and they're still related, we stop there,
+# but flag it - the run wasn't long enough to trust the interval.
+#
+# We give back the number of batches, their means, their lag 1
+# autocorrelation and whether it passed the test.  We need at least
+# min_number_of_batches values (and never fewer than 2), so each batch has at
+# least one value in it and the batch means have a standard deviation.
+def select_number_of_batches(values, initial_number_of_batches=256,
+                             min_number_of_batches=16,
+                             significance_level=0.05):
+    min_number_of_batches = max(2, min_number_of_batches)
+
+    if len(values) < min_number_of_batches:
+        raise ValueError("Need at least " + str(min_number_of_batches) +
+                         " values to split into batches, but only have " +
+                         str(len(values)))
+
+    number_of_batches = max(min_number_of_batches,
+                            min(initial_number_of_batches, len(values)))
+
+    # If the batch means were independent, their lag 1 autocorrelation would
+    # be roughly normally distributed around 0, with a standard deviation of
+    # 1 / square root of the number of batches
+    z_value = stats.norm.ppf(1 - significance_level)
+
+    while True:
+        means = batch_means(values, number_of_batches)
+        autocorrelation = lag_1_autocorrelation(means)
+
+        if autocorrelation <= z_value / math.sqrt(number_of_batches):
+            return number_of_batches, means, autocorrelation, True
+
+        if number_of_batches // 2 < min_number_of_batches:
+            return number_of_batches, means, autocorrelation, False
+
+        number_of_batches //= 2
+
+# Class to estimate the steady state results of a model from a single long
+# run, rather than lots of separate runs.  Every run has to throw away its
+# warm up period, so a trial of 100 runs throws away 100 warm ups; a single
+# long run only throws away one, and every minute after that is used.  The
+# catch is that we only have one run, so we can't get a confidence interval
+# from the differences between runs.  Instead, we split the patients (in the
+# order they finished) into batches, and treat the mean of each batch as if
+# it were the result of a separate run (this is the method of batch means).
+# The batch size is picked automatically for each KPI (see
+# select_number_of_batches above).
+#
+# This only makes sense for the steady state (long run) behaviour of models
+# that do settle down - eg not a model where arrivals change through the day
+# unless the batches are whole numbers of days, or where a queue keeps
+# growing.  The model's results_df needs a row per patient (in the order they
+# finished), with a column for each KPI.
+#
+# By default the run is 50 times the length of a normal run (after the warm
+# up, which is taken from the parameter class - see warm_up_analysis.py for
+# finding it).  If a KPI has too few values to make min_number_of_batches
+# batches (eg very few ACU patients in a short run), its results are NaN, and
+# we give a warning saying so.
+class Batch_Means_Analysis:
+    def __init__(self, model_class, parameter_class,
+                 kpis=("Q_Time_Registration", "Q_Time_Triage",
+                       "Q_Time_ED_Assessment", "Q_Time_ACU_Assessment"),
+                 run_duration=None, scenario=None, seed=None,
+                 initial_number_of_batches=256, min_number_of_batches=16,
+                 significance_level=0.05, confidence=0.95):
+        self.model_class = model_class
+        self.kpis = list(kpis)
+        self.seed = seed
+        self.initial_number_of_batches = initial_number_of_batches
+        self.min_number_of_batches = min_number_of_batches
+        self.significance_level = significance_level
+        self.confidence = confidence
+
+        if run_duration is None:
+            run_duration = 50 * parameter_class.sim_duration
+
+        long_run_scenario = dict(scenario or {})
+        long_run_scenario["sim_duration"] = run_duration
+
+        self.params = Run_Parameters.from_class(parameter_class,
+                                                **long_run_scenario)
+
+        self.patient_results_df = None
+
+    # A method to do the long run, keeping the results of each patient
+    def run(self):
+        model = self.model_class(0, self.seed, self.params)
+        model.run()
+
+        self.patient_results_df = model.results_df
+
+        return self.patient_results_df
+
+    # A method to work out the steady state mean and confidence interval for
+    # each KPI.  It does the long run if it hasn't been done yet.  We give
+    # back a DataFrame with one row per KPI, with the mean and confidence
+    # interval (like the summary of a trial), along with the number and size
+    # of the batches used and whether the batch means passed the
+    # autocorrelation check.
+    def summary(self):
+        if self.patient_results_df is None:
+            self.run()
+
+        summary_rows = []
+
+        for kpi in self.kpis:
+            values = self.patient_results_df[kpi].to_numpy(dtype=np.float64)
+            values = values[~np.isnan(values)]
+
+            if len(values) < max(2, self.min_number_of_batches):
+                warnings.warn("Only " + str(len(values)) + " values for " +
+                              kpi + " - too few to make " +
+                              str(max(2, self.min_number_of_batches)) +
+                              " batches, so its results are NaN.  Try a "
+                              "longer run.")
+
+                summary_rows.append({"KPI":kpi,
+                                     "Patients":len(values),
+                                     "Mean":float("nan"),
+                                     "Lower_CI":float("nan"),
+                                     "Upper_CI":float("nan"),
+                                     "Batches":0,
+                                     "Batch_Size":0,
+                                     "Lag_1_Autocorrelation":float("nan"),
+                                     "Batches_Independent":False})
+
+                continue
+
+            number_of_batches, means, autocorrelation, independent = (
+                select_number_of_batches(values,
+                                         self.initial_number_of_batches,
+                                         self.min_number_of_batches,
+                                         self.significance_level))
+
+            t_value = stats.t.ppf((1 + self.confidence) / 2,
+                                  number_of_batches - 1)
+            half_width = (t_value * means.std(ddof=1) /
+                          math.sqrt(number_of_batches))
+
+            summary_rows.append({"KPI":kpi,
+                                 "Patients":len(values),
+                                 "Mean":means.mean(),
+                                 "Lower_CI":means.mean() - half_width,
+                                 "Upper_CI":means.mean() + half_width,
+                                 "Batches":number_of_batches,
+                                 "Batch_Size":len(values) //
+                                 number_of_batches,
+                                 "Lag_1_Autocorrelation":autocorrelation,
+                                 "Batches_Independent":independent})
+
+        return pd.DataFrame(summary_rows).set_index("KPI")
+
+# Example - estimate the steady state queuing times for the ED model from
+# exercise 1 (with enough doctors that the queues settle down) from a single
+# long run, and compare it with a trial of separate runs that uses the same
+# total amount of simulated time (including the warm ups)
+if __name__ == "__main__":
+    from exercise_1_solution import ED_Model, g
+    from trial_runner import Trial_Runner
+
+    scenario = {"number_of_ed_doctors":4, "number_of_acu_doctors":2}
+
+    my_batch_means_analysis = Batch_Means_Analysis(ED_Model, g,
+                                                   scenario=scenario,
+                                                   seed=42)
+    batch_means_df = my_batch_means_analysis.summary()
+
+    total_simulated_time = (my_batch_means_analysis.params.sim_duration +
+                            g.warm_up_duration)
+
+    number_of_runs = int(total_simulated_time //
+                         (g.sim_duration + g.warm_up_duration))
+
+    my_trial_runner = Trial_Runner(
+        ED_Model, number_of_runs, base_seed=42,
+        params=Run_Parameters.from_class(g, **scenario))
+    trial_df = my_trial_runner.run_trial().summary()
+
+    with pd.option_context("display.width", 120,
+                           "display.max_columns", None):
+        print ("Single long run of ", total_simulated_time,
+               " minutes (batch means)", sep="")
+        print (batch_means_df.round(3))
+        print ()
+        print (number_of_runs, " runs of ", g.sim_duration +
+               g.warm_up_duration, " minutes (including warm up)", sep="")
+        print (trial_df.loc[["Mean_Q_Time_Registration",
+                             "Mean_Q_Time_Triage",
+                             "Mean_Q_Time_ED_Assessment",
+                             "Mean_Q_Time_ACU_Assessment"]].round(3))
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import pandas as pd
+from run_parameters import Run_Parameters
+from trial_runner import generate_run_seeds, map_runs, run_replication
+
+# Class to compare two scenarios of a model (eg 2 nurses vs 3 nurses) using
+# Common Random Numbers (CRN).  Run i of both scenarios is given the same seed,
+# so (as long as the model uses a separate random number stream for each
+# random process) both scenarios see the same patients with the same activity
+# times.  The difference between the scenarios in each run is then down to the
+# change we made, rather than to luck, which makes the estimate of the
+# difference far less variable.
+#
+# To show how much we've gained, we can also run scenario B again with its own
+# independent seeds, and compare the variance of the run-by-run differences
+# with CRN against the variance without.
+#
+# Each scenario is a dictionary of the parameter values it changes from those
+# in the parameter class (the g class), eg {"number_of_nurses":3}.
+class Scenario_Comparison:
+    def __init__(self, model_class, parameter_class, scenario_a, scenario_b,
+                 number_of_runs, base_seed=None, max_workers=None):
+        self.model_class = model_class
+        self.parameter_class = parameter_class
+        self.scenario_a = scenario_a
+        self.scenario_b = scenario_b
+        self.params_a = Run_Parameters.from_class(parameter_class,
+                                                  **scenario_a)
+        self.params_b = Run_Parameters.from_class(parameter_class,
+                                                  **scenario_b)
+        self.number_of_runs = number_of_runs
+
+        if max_workers is None:
+            max_workers = os.cpu_count()
+
+        self.max_workers = max_workers
+
+        # We make twice as many seeds as runs - the first half are shared by
+        # both scenarios, and the second half are only used for the
+        # independent runs of scenario B
+        self.base_seed, seeds = generate_run_seeds(2 * number_of_runs,
+                                                   base_seed)
+        self.common_seeds = seeds[:number_of_runs]
+        self.independent_seeds = seeds[number_of_runs:]
+
+    # A method to run both scenarios (and, if asked, the independent runs of
+    # scenario B), returning a DataFrame with one row per run and scenario
+    def run_scenarios(self, measure_variance_reduction=True):
+        runs_to_do = []
+
+        for run, seed in enumerate(self.common_seeds):
+            runs_to_do.append(("A", self.params_a, run, seed))
+            runs_to_do.append(("B", self.params_b, run, seed))
+
+        if measure_variance_reduction:
+            for run, seed in enumerate(self.independent_seeds):
+                runs_to_do.append(("B_Independent", self.params_b, run,
+                                   seed))
+
+        list_of_arguments = [(self.model_class, run, seed, params)
+                             for label, params, run, seed in runs_to_do]
+
+        list_of_run_results = []
+
+        for (label, params, run, seed), run_results in zip(
+                runs_to_do, map_runs(run_replication, list_of_arguments,
+                                     self.max_workers)):
+            run_results = dict(run_results)
+            run_results["Scenario"] = label
+            list_of_run_results.append(run_results)
+
+        return pd.DataFrame(list_of_run_results)
+
+    # A method to run the comparison and summarise it.  For each KPI, we get
+    # the mean difference between the scenarios (B - A), the variance of the
+    # run-by-run difference with CRN and (if measured) with independent
+    # seeds, and the variance reduction achieved by CRN.  A variance
+    # reduction of 75% means we'd need 4 times as many runs to get the same
+    # precision without CRN.
+    def run_comparison(self, measure_variance_reduction=True):
+        run_results_df = self.run_scenarios(measure_variance_reduction)
+
+        results_a = (run_results_df[run_results_df["Scenario"] == "A"]
+                     .set_index("Run").drop(columns="Scenario"))
+        results_b = (run_results_df[run_results_df["Scenario"] == "B"]
+                     .set_index("Run").drop(columns="Scenario"))
+
+        crn_differences = results_b - results_a
+
+        comparison_df = pd.DataFrame({
+            "Mean_A":results_a.mean(),
+            "Mean_B":results_b.mean(),
+            "Mean_Difference":crn_differences.mean(),
+            "Var_Difference_CRN":crn_differences.var()})
+
+        if measure_variance_reduction:
+            results_b_independent = (
+                run_results_df[run_results_df["Scenario"] == "B_Independent"]
+                .set_index("Run").drop(columns="Scenario"))
+
+            independent_differences = results_b_independent - results_a
+
+            comparison_df["Var_Difference_Independent"] = (
+                independent_differences.var())
+            comparison_df["Variance_Reduction_%"] = 100 * (
+                1 - comparison_df["Var_Difference_CRN"] /
+                comparison_df["Var_Difference_Independent"])
+
+        comparison_df.index.name = "KPI"
+
+        return comparison_df
+
+# Example - compare 2 ED doctors against 3 ED doctors in the ED model from
+# exercise 1
+if __name__ == "__main__":
+    from exercise_1_solution import ED_Model, g
+
+    my_comparison = Scenario_Comparison(ED_Model, g,
+                                        {"number_of_ed_doctors":2},
+                                        {"number_of_ed_doctors":3},
+                                        number_of_runs=50)
+
+    comparison_df = my_comparison.run_comparison()
+
+    with pd.option_context("display.width", 120,
+                           "display.max_columns", None):
+        print (comparison_df.round(2))
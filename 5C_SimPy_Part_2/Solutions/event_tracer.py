@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import numpy as np
+import pandas as pd
+
+# The layout of a single trace record.  Every record is the same size (15
+# bytes), so a trace file is just one record after another, and can be read
+# straight back in as a NumPy structured array (one column per field).
+TRACE_RECORD_TYPE = np.dtype([("time", "<f8"),
+                              ("patient_id", "<i4"),
+                              ("resource_id", "<i2"),
+                              ("event_type", "<i1")])
+
+# The kinds of event we record
+QUEUE = 0
+SEIZE = 1
+RELEASE = 2
+EVENT_TYPE_NAMES = ["Queue", "Seize", "Release"]
+
+# Class to record every queue entry, seize and release of a resource in a
+# run, so we can see exactly where patients were held up.  Printing or adding
+# a DataFrame row for each event would slow the model right down, so instead
+# we add each record to a plain Python list (which is very quick), and write
+# the list out in one go as a block of fixed-width binary records whenever it
+# gets big enough.  If we give a filename, the blocks are written to that
+# file as we go (so even very long runs don't need to keep the trace in
+# memory); otherwise they're kept in memory.
+#
+# Resources are recorded by number rather than by name, to keep the records
+# small - the first resource we see is number 0, the next number 1, and so
+# on.  The names (in number order) are in resource_names, and are saved next
+# to the trace file (in a .json file with the same name) when we close it.
+#
+# A model only records events if it's been given a tracer, and checks for
+# one with a single "is not None" test at each activity, so a model without a
+# tracer runs at the same speed as before.
+class Event_Tracer:
+    def __init__(self, filename=None, block_size=65536):
+        self.filename = filename
+        self.block_size = block_size
+        self.resource_ids = {}
+        self.resource_names = []
+        self.number_of_records = 0
+
+        self.pending_records = []
+        self.written_blocks = []
+
+        self.trace_file = None
+
+        if filename is not None:
+            self.trace_file = open(filename, "wb")
+
+    def resource_id(self, resource_name):
+        if resource_name not in self.resource_ids:
+            self.resource_ids[resource_name] = len(self.resource_names)
+            self.resource_names.append(resource_name)
+
+        return self.resource_ids[resource_name]
+
+    # A method to record that a patient has joined the queue for a resource
+    def record_queue_entry(self, time, patient_id, resource_name):
+        self.pending_records.append(
+            (time, patient_id, self.resource_id(resource_name), QUEUE))
+
+        if len(self.pending_records) >= self.block_size:
+            self.flush()
+
+    # A method to record that a patient got hold of a resource (at
+    # seize_time) and let go of it again (at release_time).  We record both
+    # at once, when the patient lets go, so the model only needs to call the
+    # tracer once for each activity after the patient has finished queuing.
+    # This does mean a patient still with a resource at the end of the run
+    # will only have a queue entry.
+    def record_service(self, seize_time, release_time, patient_id,
+                       resource_name):
+        resource_id = self.resource_id(resource_name)
+
+        self.pending_records.append((seize_time, patient_id, resource_id,
+                                     SEIZE))
+        self.pending_records.append((release_time, patient_id, resource_id,
+                                     RELEASE))
+
+        if len(self.pending_records) >= self.block_size:
+            self.flush()
+
+    # A method to turn the records we've built up into a block of binary
+    # records, and write it to the file (or keep it in memory)
+    def flush(self):
+        if not self.pending_records:
+            return
+
+        block = np.array(self.pending_records, dtype=TRACE_RECORD_TYPE)
+        self.number_of_records += len(block)
+        self.pending_records = []
+
+        if self.trace_file is not None:
+            self.trace_file.write(block.tobytes())
+        else:
+            self.written_blocks.append(block)
+
+    # A method to finish the trace - we write any records still waiting, and
+    # save the resource and event type names alongside the trace file
+    def close(self):
+        self.flush()
+
+        if self.trace_file is not None and not self.trace_file.closed:
+            self.trace_file.close()
+
+            with open(self.filename + ".json", "w") as names_file:
+                json.dump({"resource_names":self.resource_names,
+                           "event_type_names":EVENT_TYPE_NAMES}, names_file)
+
+    # A method to get the whole trace as a structured array, sorted into time
+    # order (records are written when each activity finishes, so they're not
+    # quite in time order as they stand)
+    def records(self):
+        self.flush()
+
+        if self.number_of_records == 0:
+            trace = np.empty(0, dtype=TRACE_RECORD_TYPE)
+        elif self.trace_file is not None:
+            if not self.trace_file.closed:
+                self.trace_file.flush()
+
+            trace = load_trace(self.filename)
+        else:
+            trace = np.concatenate(self.written_blocks)
+
+        return np.sort(trace, order=["time", "patient_id"], kind="stable")
+
+# Function to open a trace file that's been written by an Event_Tracer.  The
+# file is memory-mapped, so only the parts of it we look at are read in from
+# disk - we can open a trace of millions of events instantly.
+def load_trace(filename):
+    return np.memmap(filename, dtype=TRACE_RECORD_TYPE, mode="r")
+
+# Function to turn a trace into a DataFrame, with the resource and event type
+# numbers swapped for their names
+def trace_to_dataframe(trace, resource_names):
+    trace_df = pd.DataFrame(np.asarray(trace))
+    trace_df["resource"] = pd.Categorical.from_codes(trace_df["resource_id"],
+                                                     resource_names)
+    trace_df["event"] = pd.Categorical.from_codes(trace_df["event_type"],
+                                                  EVENT_TYPE_NAMES)
+
+    return trace_df.drop(columns=["resource_id", "event_type"])
@@ -2,15 +2,28 @@
 # -*- coding: utf-8 -*-
 
 import simpy
-import random
 import pandas as pd
-import csv
+from run_parameters import Run_Parameters
+from random_streams import Random_Streams
+from variate_pool import Variate_Pool
+from time_varying_arrivals import Time_Varying_Arrivals
+from patient_results_buffer import Patient_Results_Buffer
+from monitored_resource import Monitored_Resource
+from trial_runner import Trial_Runner
 
 # Class to store global parameter values.  We don't create an instance of this
 # class - we just refer to the class blueprint itself to access the numbers
 # inside
 class g:
     ed_inter = 8
+    
+    # To have the arrival rate change over time, set this to a table of the
+    # average number of arrivals in each hour (eg 168 values - one for each
+    # hour of the week, see weekly_arrival_profile in
+    # time_varying_arrivals.py).  If it's None, patients arrive every ed_inter
+    # minutes on average, all the time.
+    arrival_rate_profile = None
+    
     mean_register = 2
     mean_triage = 5
     mean_ed_assess = 30
@@ -31,6 +44,15 @@ class g:
 # patient ID and whether the patient will be sent to the ACU or stay in the
 # ED, along with a method that makes that determination randomly
 class ED_Patient:
+    # We list the attributes each patient has up front (in __slots__), so
+    # Python can store them in a fixed-size record rather than a dictionary.
+    # This uses much less memory per patient, which adds up when there are
+    # lots of patients in the system at once, and makes looking up the
+    # attributes a little quicker too.  The catch is that we can't add any
+    # other attributes to a patient without adding them to this list.
+    __slots__ = ("id", "prob_acu", "acu_patient", "q_time_reg",
+                 "q_time_triage", "q_time_ed_assess", "q_time_acu_assess")
+    
     def __init__(self, p_id, prob_acu):
         self.id = p_id
         self.prob_acu = prob_acu
@@ -42,40 +64,104 @@ class ED_Patient:
         self.q_time_acu_assess = 0
         
     # Method to determine whether or not this patient will be diverted to the
-    # ACU, based on their probability of being an ACU patient
-    def determine_acu_destiny(self):
-        if random.uniform(0, 1) < self.prob_acu:
+    # ACU, based on their probability of being an ACU patient.  We pass in the
+    # pool of uniform random numbers (between 0 and 1) to draw from
+    def determine_acu_destiny(self, uniform_draws):
+        if uniform_draws.sample() < self.prob_acu:
             self.acu_patient = True
             
 # Class representing our model of the ED
 class ED_Model:
-    def __init__(self, run_number):
+    def __init__(self, run_number, seed=None, params=None, tracer=None):
+        # The parameter values for this run.  If we're not given any, we take
+        # a copy of the values in the g class.  The copy can't be changed, so
+        # the run isn't affected by anything else changing the g class.
+        if params is None:
+            params = Run_Parameters.from_class(g)
+            
+        self.params = params
+        
         self.env = simpy.Environment()
         self.patient_counter = 0
         
-        self.receptionist = simpy.Resource(self.env,
-                                           capacity=g.number_of_receptionists)
-        self.nurse = simpy.Resource(self.env,
-                                    capacity=g.number_of_nurses)
-        self.ed_doctor = simpy.Resource(self.env,
-                                        capacity=g.number_of_ed_doctors)
-        self.acu_doctor = simpy.Resource(self.env,
-                                         capacity=g.number_of_acu_doctors)
+        # An Event_Tracer to record every queue entry, seize and release of a
+        # resource (eg for finding bottlenecks), or None (the default) to not
+        # record them
+        self.tracer = tracer
+        
+        # Our resources are monitored, so we can measure how busy each one
+        # was, and how long its queue was on average, after the warm up
+        self.receptionist = Monitored_Resource(
+            self.env, capacity=self.params.number_of_receptionists,
+            statistics_start_time=self.params.warm_up_duration)
+        self.nurse = Monitored_Resource(
+            self.env, capacity=self.params.number_of_nurses,
+            statistics_start_time=self.params.warm_up_duration)
+        self.ed_doctor = Monitored_Resource(
+            self.env, capacity=self.params.number_of_ed_doctors,
+            statistics_start_time=self.params.warm_up_duration)
+        self.acu_doctor = Monitored_Resource(
+            self.env, capacity=self.params.number_of_acu_doctors,
+            statistics_start_time=self.params.warm_up_duration)
         
         self.run_number = run_number
         
+        # Set up a separate random number stream for each random process in
+        # the model, all created from this run's seed.  Running two scenarios
+        # with the same seed then gives them the same patients, with the same
+        # activity times (common random numbers)
+        self.streams = Random_Streams(seed, ["arrivals",
+                                             "acu_destiny",
+                                             "registration",
+                                             "triage",
+                                             "ed_assessment",
+                                             "acu_assessment",
+                                             "priority"])
+        
+        # Rather than asking the streams for one sample at a time, each
+        # random process gets a pool of samples, which are drawn from its
+        # stream in large blocks and handed out as they're needed
+        if self.params.arrival_rate_profile is None:
+            self.inter_arrival_times = Variate_Pool(
+                self.streams.arrivals, "exponential",
+                scale=self.params.ed_inter)
+        else:
+            self.inter_arrival_times = Time_Varying_Arrivals(
+                self.streams.arrivals, self.params.arrival_rate_profile,
+                period_length=60)
+        self.acu_destiny_draws = Variate_Pool(
+            self.streams.acu_destiny, "uniform")
+        self.registration_times = Variate_Pool(
+            self.streams.registration, "exponential",
+            scale=self.params.mean_register)
+        self.triage_times = Variate_Pool(
+            self.streams.triage, "exponential", scale=self.params.mean_triage)
+        self.ed_assessment_times = Variate_Pool(
+            self.streams.ed_assessment, "exponential",
+            scale=self.params.mean_ed_assess)
+        self.acu_assessment_times = Variate_Pool(
+            self.streams.acu_assessment, "exponential",
+            scale=self.params.mean_acu_assess)
+        
         self.mean_q_time_registration = 0
         self.mean_q_time_triage = 0
         self.mean_q_time_ed_assessment = 0
         self.mean_q_time_acu_assessment = 0
         
+        # Patient results are stored in a results buffer as the run goes
+        # along, and only turned into a DataFrame at the end of the run.  We
+        # give the buffer room for a bit more than the number of patients we
+        # expect to arrive after the warm up, so it'll rarely need to grow.
+        expected_patients = int(1.2 * self.params.sim_duration /
+                                self.params.ed_inter)
+        self.patient_results = Patient_Results_Buffer(
+            "P_ID", ["Q_Time_Registration",
+                     "Q_Time_Triage",
+                     "Q_Time_ED_Assessment",
+                     "Q_Time_ACU_Assessment",
+                     "Time_Completed"],
+            initial_capacity=expected_patients)
         self.results_df = pd.DataFrame()
-        self.results_df["P_ID"] = []
-        self.results_df["Q_Time_Registration"] = []
-        self.results_df["Q_Time_Triage"] = []
-        self.results_df["Q_Time_ED_Assessment"] = []
-        self.results_df["Q_Time_ACU_Assessment"] = []
-        self.results_df.set_index("P_ID", inplace=True)
         
     # A method that generates patients arriving at the ED
     def generate_ed_arrivals(self):
@@ -85,18 +171,18 @@ class ED_Model:
             self.patient_counter += 1
             
             # Create a new patient
-            p = ED_Patient(self.patient_counter, g.prob_acu)
+            p = ED_Patient(self.patient_counter, self.params.prob_acu)
             
             # Determine the patient's ACU destiny by running the appropriate
             # method
-            p.determine_acu_destiny()
+            p.determine_acu_destiny(self.acu_destiny_draws)
             
             # Get the SimPy environment to run the ed_patient_journey method 
             # with this patient
             self.env.process(self.ed_patient_journey(p))
             
             # Randomly sample the time to the next patient arriving
-            sampled_interarrival = random.expovariate(1.0 / g.ed_inter)
+            sampled_interarrival = self.inter_arrival_times.sample()
             
             # Freeze this function until that time has elapsed
             yield self.env.timeout(sampled_interarrival)
@@ -105,6 +191,10 @@ class ED_Model:
         """REGISTRATION"""
         # Record the time the patient started queuing for registration
         start_q_reg = self.env.now
+
+        if self.tracer is not None:
+            self.tracer.record_queue_entry(start_q_reg, patient.id,
+                                           "Receptionist")
         
         # Request a receptionist
         with self.receptionist.request() as req:
@@ -119,14 +209,22 @@ class ED_Model:
             patient.q_time_reg = end_q_reg - start_q_reg
             
             # Randomly sample the time the patient will spend being registered
-            sampled_reg_duration = random.expovariate(1.0 / g.mean_register)
+            sampled_reg_duration = self.registration_times.sample()
             
             # Freeze this function until that time has elapsed
             yield self.env.timeout(sampled_reg_duration)
+
+        if self.tracer is not None:
+            self.tracer.record_service(end_q_reg, self.env.now, patient.id,
+                                       "Receptionist")
             
         """TRIAGE"""
         # Record the time the patient started queuing for triage
         start_q_triage = self.env.now
+
+        if self.tracer is not None:
+            self.tracer.record_queue_entry(start_q_triage, patient.id,
+                                           "Nurse")
         
         # Request a nurse
         with self.nurse.request() as req:
@@ -141,10 +239,14 @@ class ED_Model:
             patient.q_time_triage = end_q_triage - start_q_triage
             
             # Randomly sample the time the patient will spend being triaged
-            sampled_triage_duration = random.expovariate(1.0 / g.mean_triage)
+            sampled_triage_duration = self.triage_times.sample()
             
             # Freeze this function until that time has elapsed
             yield self.env.timeout(sampled_triage_duration)
+
+        if self.tracer is not None:
+            self.tracer.record_service(end_q_triage, self.env.now, patient.id,
+                                       "Nurse")
             
         """BRANCH - ED ASSESSMENT OR ACU ASSESSMENT"""
         # Check if patient destined for ACU or not, and either send to ACU
@@ -153,6 +255,10 @@ class ED_Model:
             """ACU ASSESSMENT"""
             # Record the time the patient started queuing for ACU assessment
             start_q_acu_assess = self.env.now
+
+            if self.tracer is not None:
+                self.tracer.record_queue_entry(start_q_acu_assess, patient.id,
+                                               "ACU_Doctor")
             
             # Request an ACU doctor
             with self.acu_doctor.request() as req:
@@ -171,14 +277,22 @@ class ED_Model:
                 # Randomly sample the time the patient will spend being 
                 # assessed
                 sampled_acu_assess_duration = (
-                    random.expovariate(1.0 / g.mean_acu_assess))
+                    self.acu_assessment_times.sample())
                 
                 # Freeze this function until that time has elapsed
                 yield self.env.timeout(sampled_acu_assess_duration)
+
+            if self.tracer is not None:
+                self.tracer.record_service(end_q_acu_assess, self.env.now,
+                                           patient.id, "ACU_Doctor")
         else:
             """ED ASSESSMENT"""
             # Record the time the patient started queuing for ED assessment
             start_q_ed_assess = self.env.now
+
+            if self.tracer is not None:
+                self.tracer.record_queue_entry(start_q_ed_assess, patient.id,
+                                               "ED_Doctor")
             
             # Request an ED doctor
             with self.ed_doctor.request() as req:
@@ -196,25 +310,29 @@ class ED_Model:
                 # Randomly sample the time the patient will spend being 
                 # assessed
                 sampled_ed_assess_duration = (
-                    random.expovariate(1.0 / g.mean_ed_assess))
+                    self.ed_assessment_times.sample())
                 
                 # Freeze this function until that time has elapsed
                 yield self.env.timeout(sampled_ed_assess_duration)
+
+            if self.tracer is not None:
+                self.tracer.record_service(end_q_ed_assess, self.env.now,
+                                           patient.id, "ED_Doctor")
         
         # If the warm up time has passed, then call the store_patient_results 
         # method (this doesn't need to be processed by the environment, as it's
         # not a generator function)
-        if self.env.now > g.warm_up_duration:
+        if self.env.now > self.params.warm_up_duration:
             self.store_patient_results(patient)
         
-    # A method to store the patient's results (queuing times here) for this
-    # run alongside their patient ID in the Pandas DataFrame of the ED_Model
-    # class
+    # A method to store the patient's results (queuing times here, along
+    # with the time they finished their journey) for this run alongside their
+    # patient ID in the results buffer of the ED_Model class
     def store_patient_results(self, patient):        
         # First, because we have a branching path, this patient will have
         # queued for either ED assessment or ACU assessment, but not both.
         # Therefore, we need to check which happened, and insert NaNs
-        # (Not A Number) in the entries for the other queue in the DataFrame.
+        # (Not A Number) in the entries for the other queue in the results.
         # NaNs are automatically ignored by Pandas when calculating the mean
         # etc.  We can create a nan by casting the string 'nan' as a float :
         # float("nan")
@@ -223,21 +341,19 @@ class ED_Model:
         else:
             patient.q_time_acu_assess = float("nan")
             
-        df_to_add = pd.DataFrame({"P_ID":[patient.id],
-                                  "Q_Time_Registration":[patient.q_time_reg],
-                                  "Q_Time_Triage":[patient.q_time_triage],
-                                  "Q_Time_ED_Assessment":(
-                                      [patient.q_time_ed_assess]),
-                                  "Q_Time_ACU_Assessment":(
-                                      [patient.q_time_acu_assess]),
-                                  })
-        
-        df_to_add.set_index("P_ID", inplace=True)
-        self.results_df = self.results_df.append(df_to_add)
+        self.patient_results.add_row(patient.id,
+                                     patient.q_time_reg,
+                                     patient.q_time_triage,
+                                     patient.q_time_ed_assess,
+                                     patient.q_time_acu_assess,
+                                     self.env.now)
 
     # A method that calculates the average queuing times for each queue.  We
-    # can call this at the end of each run
+    # can call this at the end of each run, and it's here that we turn the
+    # results buffer into a DataFrame
     def calculate_mean_q_times(self):
+        self.results_df = self.patient_results.to_dataframe()
+        
         self.mean_q_time_registration = (
             self.results_df["Q_Time_Registration"].mean())
         self.mean_q_time_triage = (
@@ -247,89 +363,110 @@ class ED_Model:
         self.mean_q_time_acu_assessment = (
             self.results_df["Q_Time_ACU_Assessment"].mean())
         
-    # A method to write run results to file
-    def write_run_results(self):
-        with open("trial_ed_results.csv", "a") as f:
-            writer = csv.writer(f, delimiter=",")
-            results_to_write = [self.run_number,
-                                self.mean_q_time_registration,
-                                self.mean_q_time_triage,
-                                self.mean_q_time_ed_assessment,
-                                self.mean_q_time_acu_assessment]
-            writer.writerow(results_to_write)
+    # A method that returns the results of this run as a dictionary, so they
+    # can be passed back to whatever is running the trial
+    def get_run_results(self):
+        return {"Run":self.run_number,
+                "Mean_Q_Time_Registration":self.mean_q_time_registration,
+                "Mean_Q_Time_Triage":self.mean_q_time_triage,
+                "Mean_Q_Time_ED_Assessment":self.mean_q_time_ed_assessment,
+                "Mean_Q_Time_ACU_Assessment":self.mean_q_time_acu_assessment,
+                **self.get_resource_results()}
+    
+    # A method that returns the utilisation and average queue length of each
+    # resource (over the time after the warm up) as a dictionary
+    def get_resource_results(self):
+        resource_results = {}
+        
+        for name, resource in [("Receptionist", self.receptionist),
+                               ("Nurse", self.nurse),
+                               ("ED_Doctor", self.ed_doctor),
+                               ("ACU_Doctor", self.acu_doctor)]:
+            resource_results["Utilisation_" + name] = resource.utilisation()
+            resource_results["Mean_Queue_Length_" + name] = (
+                resource.mean_queue_length())
+            
+        return resource_results
             
     # The run method starts up the entity generators, and tells SimPy to start
-    # running the environment for the duration specified in the g class. After
-    # the simulation has run, it calls the methods that calculate run
-    # results, and the method that writes these results to file
+    # running the environment for the duration specified in the run's
+    # parameters. After the simulation has run, it calls the methods that
+    # calculate run results, and hands these results back
     def run(self):
         # Start entity generators
         self.env.process(self.generate_ed_arrivals())
         
         # Run simulation
-        self.env.run(until=(g.sim_duration + g.warm_up_duration))
+        self.env.run(until=(self.params.sim_duration +
+                            self.params.warm_up_duration))
+        
+        # Write out anything the tracer hasn't written yet
+        if self.tracer is not None:
+            self.tracer.close()
         
         # Calculate run results
         self.calculate_mean_q_times()
         
-        # Write run results to file
-        self.write_run_results()
+        # Return run results
+        return self.get_run_results()
 
-# Class to store, calculate and manipulate trial results
+# Class to store, calculate and manipulate trial results.  The results of
+# each run are kept in a Trial_Results_Aggregator (which the trial runner
+# hands back to us), so we don't need to read anything back in from file.
 class Trial_Results_Calculator:
-    def __init__(self):
-        self.trial_results_df = pd.DataFrame()
+    def __init__(self, trial_results):
+        self.trial_results = trial_results
         
-    # A method to read in the trial results and print them for the user
+    # A method to print the trial results for the user - the average over
+    # runs, along with a 95% confidence interval for that average
     def print_trial_results(self):
         print ("TRIAL RESULTS")
         print ("-------------")
         
-        # Read in results from each run
-        self.trial_results_df = pd.read_csv("trial_ed_results.csv")
+        kpis_to_print = [
+            ("Registration", "Mean_Q_Time_Registration"),
+            ("Triage", "Mean_Q_Time_Triage"),
+            ("ED Assessment", "Mean_Q_Time_ED_Assessment"),
+            ("ACU Assessment", "Mean_Q_Time_ACU_Assessment")]
         
-        # Take average over runs
-        trial_mean_q_time_registration = (
-            self.trial_results_df["Mean_Q_Time_Registration"].mean())
-        trial_mean_q_time_triage = (
-            self.trial_results_df["Mean_Q_Time_Triage"].mean())
-        trial_mean_q_time_ed_assess = (
-            self.trial_results_df["Mean_Q_Time_ED_Assessment"].mean())
-        trial_mean_q_time_acu_assess = (
-            self.trial_results_df["Mean_Q_Time_ACU_Assessment"].mean())
+        for queue_name, kpi in kpis_to_print:
+            trial_mean = self.trial_results.mean(kpi)
+            lower_ci, upper_ci = self.trial_results.confidence_interval(kpi)
+            
+            print ("Mean Queuing Time for ", queue_name, " over Trial : ",
+                   round(trial_mean, 2), " (95% CI ", round(lower_ci, 2),
+                   " to ", round(upper_ci, 2), ")", sep="")
+            
+        resources_to_print = [("Receptionist", "Receptionist"),
+                              ("Nurse", "Nurse"),
+                              ("ED Doctor", "ED_Doctor"),
+                              ("ACU Doctor", "ACU_Doctor")]
         
-        print ("Mean Queuing Time for Registration over Trial : ",
-               round(trial_mean_q_time_registration, 2))
-        print ("Mean Queuing Time for Triage over Trial : ",
-               round(trial_mean_q_time_triage, 2))
-        print ("Mean Queuing Time for ED Assessment over Trial : ",
-               round(trial_mean_q_time_ed_assess, 2))
-        print ("Mean Queuing Time for ACU Assessment over Trial : ",
-               round(trial_mean_q_time_acu_assess, 2))
+        for resource_name, kpi_suffix in resources_to_print:
+            print ("Mean Utilisation of ", resource_name, " over Trial : ",
+                   round(100 * self.trial_results.mean(
+                       "Utilisation_" + kpi_suffix), 1), "%", sep="")
 
 # Everything above is definition of classes and functions, but here's where
 # the code will start actively doing things.        
 
-# Create a file to store trial results
-with open("trial_ed_results.csv", "w") as f:
-    writer = csv.writer(f, delimiter=",")
-    column_headers = ["Run",
-                      "Mean_Q_Time_Registration",
-                      "Mean_Q_Time_Triage",
-                      "Mean_Q_Time_ED_Assessment",
-                      "Mean_Q_Time_ACU_Assessment"]
-    writer.writerow(column_headers)
-
-# For the number of runs specified in the g class, create an instance of the
-# ED_Model class, and call its run method
-for run in range(g.number_of_runs):
-    print ("Run ", run+1, " of ", g.number_of_runs, sep="")
-    my_ed_model = ED_Model(run)
-    my_ed_model.run()
-    print ()
+# The code below is wrapped in an if statement that checks we're running this
+# file directly.  This is needed because the trial runner starts up new Python
+# processes to do the runs, and these processes import this file to find the
+# ED_Model class - we don't want each of them to start a trial of their own!
+if __name__ == "__main__":
+    # Create a trial runner, giving it our model class and the number of runs
+    # specified in the g class.  The runner will farm the runs out over all of
+    # the cores on the computer, giving each run its own random number seed.
+    my_trial_runner = Trial_Runner(ED_Model, g.number_of_runs)
+    trial_results = my_trial_runner.run_trial()
 
-# Once the trial is complete, we'll create an instance of the
-# Trial_Result_Calculator class and run the print_trial_results method
-my_trial_results_calculator = Trial_Results_Calculator()
-my_trial_results_calculator.print_trial_results()
+    # Write the results of all the runs to file in one go.  If you don't
+    # need the file, you can remove this line - nothing below relies on it.
+    # (Give the filename a .parquet ending to write a Parquet file instead)
+    trial_results.write_results("trial_ed_results.csv")
 
+    # Once the trial is complete, we'll create an instance of the
+    # Trial_Result_Calculator class and run the print_trial_results method
+    my_trial_results_calculator = Trial_Results_Calculator(trial_results)
+    my_trial_results_calculator.print_trial_results()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import simpy
+
+# Class that adds monitoring to a SimPy resource, so we can measure how busy
+# it was (its utilisation) and how long its queue was on average over a run.
+# Both of these need to be averaged over time, rather than over patients - a
+# queue of 10 people for an hour counts for much more than a queue of 10
+# people for a minute.
+#
+# Rather than checking the resource every so often (which would add lots of
+# extra events to the simulation, and miss anything that happened in
+# between), we keep a running total of queue length x time and number of
+# resources in use x time.  Every time the queue or the number in use is about
+# to change, we add on the time since the last change multiplied by the value
+# it's had over that time.  Dividing these totals by the time that's passed
+# gives the time-weighted averages.  This costs nothing in terms of events -
+# the resource is only ever looked at when something's already happening to
+# it.
+#
+# The totals only start building up from statistics_start_time (eg the end of
+# the warm up period), so we can leave out the warm up.
+#
+# We don't use this class on its own - we combine it with one of SimPy's
+# resource classes (see Monitored_Resource and Monitored_Priority_Resource
+# below).  Note that requests that are cancelled before they're met (eg a
+# patient giving up and leaving the queue) are only picked up at the next
+# change to the resource.
+class Resource_Monitor:
+    def __init__(self, env, capacity=1, statistics_start_time=0):
+        super().__init__(env, capacity)
+
+        self.statistics_start_time = statistics_start_time
+        self.last_change_time = statistics_start_time
+        self.queue_length_time_total = 0.0
+        self.in_use_time_total = 0.0
+        self.capacity_time_total = 0.0
+
+    # A method to add on the time since the last change, multiplied by the
+    # current queue length, number in use and capacity (which haven't changed
+    # since then).  This is called just before any change.
+    def update_statistics(self):
+        now = self._env.now
+
+        if now > self.last_change_time:
+            time_since_last_change = now - self.last_change_time
+
+            self.queue_length_time_total += (time_since_last_change *
+                                             len(self.queue))
+            self.in_use_time_total += time_since_last_change * len(self.users)
+
+            # If more are in use than the capacity (eg doctors still seeing
+            # patients after the end of their shift on a roster), those
+            # carrying on are counted as available whilst they finish off
+            self.capacity_time_total += (time_since_last_change *
+                                         max(self.capacity, len(self.users)))
+
+            self.last_change_time = now
+
+    # A request joins the queue for the resource
+    def request(self, *args, **kwargs):
+        self.update_statistics()
+
+        return super().request(*args, **kwargs)
+
+    # A request at the front of the queue gets the resource
+    def _do_put(self, event):
+        self.update_statistics()
+
+        return super()._do_put(event)
+
+    # A request that had the resource lets go of it
+    def _do_get(self, event):
+        self.update_statistics()
+
+        return super()._do_get(event)
+
+    def time_monitored(self):
+        self.update_statistics()
+
+        return max(0, self._env.now - self.statistics_start_time)
+
+    # The time-weighted average number of requests waiting in the queue
+    def mean_queue_length(self):
+        time_monitored = self.time_monitored()
+
+        if time_monitored == 0:
+            return float("nan")
+
+        return self.queue_length_time_total / time_monitored
+
+    # The proportion of the available resource time that was in use (eg 0.8
+    # means the resource was busy 80% of the time).  If the capacity changes
+    # during the run (eg a rostered resource), the available time is worked
+    # out from the capacity at each point in time.  Time spent finishing off
+    # after the capacity has gone down (overrunning the end of a shift)
+    # counts as both available and in use, so the utilisation can't go above
+    # 100%.
+    def utilisation(self):
+        self.update_statistics()
+
+        if self.capacity_time_total == 0:
+            return float("nan")
+
+        return self.in_use_time_total / self.capacity_time_total
+
+# A SimPy Resource with monitoring
+class Monitored_Resource(Resource_Monitor, simpy.Resource):
+    pass
+
+# A SimPy PriorityResource with monitoring
+class Monitored_Priority_Resource(Resource_Monitor, simpy.PriorityResource):
+    pass
+
+# A SimPy PreemptiveResource with monitoring
+class Monitored_Preemptive_Resource(Resource_Monitor,
+                                    simpy.PreemptiveResource):
+    pass
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+
+# Class to store the results of each patient in a run.  Adding a row at a time
+# to a Pandas DataFrame is very slow, because Pandas copies the whole
+# DataFrame every time we add a row, so the more patients we have, the slower
+# it gets.  Instead, we keep one NumPy array per column, set up with room for
+# plenty of patients before we start.  If we run out of room, we double the
+# size of the arrays (so this only happens a handful of times, even in very
+# long runs).  Once the run's finished, we turn the arrays into a DataFrame in
+# one go.
+class Patient_Results_Buffer:
+    def __init__(self, index_name, column_names, initial_capacity=1024):
+        self.index_name = index_name
+        self.column_names = list(column_names)
+        self.number_of_rows = 0
+
+        self.index_values = np.empty(initial_capacity, dtype=np.int64)
+        self.columns = {name:np.empty(initial_capacity, dtype=np.float64)
+                        for name in self.column_names}
+
+    # A method to add the results for a single patient.  The values need to
+    # be given in the same order as the column names we gave when we set up
+    # the buffer
+    def add_row(self, index_value, *values):
+        if self.number_of_rows == len(self.index_values):
+            self.grow()
+
+        row = self.number_of_rows
+
+        self.index_values[row] = index_value
+
+        for name, value in zip(self.column_names, values):
+            self.columns[name][row] = value
+
+        self.number_of_rows += 1
+
+    # A method to double the amount of room we have in each of the arrays,
+    # copying across what we've stored so far
+    def grow(self):
+        new_capacity = max(1, 2 * len(self.index_values))
+
+        new_index_values = np.empty(new_capacity, dtype=np.int64)
+        new_index_values[:self.number_of_rows] = (
+            self.index_values[:self.number_of_rows])
+        self.index_values = new_index_values
+
+        for name in self.column_names:
+            new_column = np.empty(new_capacity, dtype=np.float64)
+            new_column[:self.number_of_rows] = (
+                self.columns[name][:self.number_of_rows])
+            self.columns[name] = new_column
+
+    # A method to turn the results stored so far into a Pandas DataFrame, with
+    # one row per patient
+    def to_dataframe(self):
+        index = pd.Index(self.index_values[:self.number_of_rows],
+                         name=self.index_name)
+
+        return pd.DataFrame({name:self.columns[name][:self.number_of_rows]
+                             for name in self.column_names}, index=index)
+
+    def __len__(self):
+        return self.number_of_rows
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import math
+import pandas as pd
+from run_parameters import Run_Parameters
+
+# Queueing theory approximations for the ED model, which let us screen
+# hundreds of staffing levels in a fraction of a second, so we only need to
+# run the full simulation for the most promising ones.  These treat each
+# activity as a queue with c identical servers in its steady state, so they
+# don't include a warm up, priorities or staff unavailability, and they're
+# only approximate - but they're very good at telling a bad staffing level
+# from a good one.
+
+# Function to calculate the Erlang C formula - the probability that an
+# arriving patient has to wait, for a queue with the given number of servers
+# and offered load (the arrival rate x the mean service time, ie how many
+# servers' worth of work arrives).  We work this out from the Erlang B
+# formula, which we can build up one server at a time without the huge
+# factorials in the textbook formula.
+def erlang_c(offered_load, servers):
+    if offered_load >= servers:
+        return 1.0
+
+    erlang_b = 1.0
+
+    for k in range(1, servers + 1):
+        erlang_b = offered_load * erlang_b / (k + offered_load * erlang_b)
+
+    return servers * erlang_b / (servers - offered_load * (1 - erlang_b))
+
+# Function to calculate the mean time in the queue for an M/M/c queue (random
+# arrivals, exponential service times and c servers).  If work arrives faster
+# than the servers can get through it, the queue grows forever, so we give
+# back infinity.
+def mmc_mean_queuing_time(arrival_rate, mean_service_time, servers):
+    offered_load = arrival_rate * mean_service_time
+
+    if offered_load >= servers:
+        return math.inf
+
+    return (erlang_c(offered_load, servers) * mean_service_time /
+            (servers - offered_load))
+
+# Function to calculate the Allen-Cunneen approximation of the mean time in
+# the queue for a G/G/c queue, where arrivals and service times can be more
+# or less variable than random.  The variability of each is given by its
+# squared coefficient of variation (the variance divided by the mean
+# squared), which is 1 for exponential times - in which case this gives the
+# M/M/c answer.  With one server, this is Kingman's formula.
+def allen_cunneen_mean_queuing_time(arrival_rate, mean_service_time, servers,
+                                    arrival_scv=1.0, service_scv=1.0):
+    return ((arrival_scv + service_scv) / 2 *
+            mmc_mean_queuing_time(arrival_rate, mean_service_time, servers))
+
+# Function to work out how variable the times between patients leaving a
+# queue are (which are the times between arrivals at the next queue), using
+# Whitt's linking equation.  A busy queue passes on the variability of its
+# service times; a quiet one passes on the variability of its arrivals.
+def departure_scv(arrival_scv, service_scv, utilisation, servers):
+    return (1 + (1 - utilisation ** 2) * (arrival_scv - 1) +
+            utilisation ** 2 * (service_scv - 1) / math.sqrt(servers))
+
+# Class to approximate the ED model (registration -> triage -> either ED
+# assessment or ACU assessment) as a network of queues.  We give it the
+# parameter class (the g class) for the base values, along with the
+# variability (squared coefficient of variation) of the time between
+# arrivals and of each activity time - all 1 by default, as the model uses
+# exponential times throughout.
+#
+# A proportion prob_acu of patients leaving triage go to ACU assessment, and
+# the rest go to ED assessment.  Splitting the patients like this makes the
+# arrivals at each branch more random (closer to a scv of 1).
+class Queueing_Network_Approximation:
+    def __init__(self, parameter_class, arrival_scv=1.0,
+                 registration_scv=1.0, triage_scv=1.0, ed_assessment_scv=1.0,
+                 acu_assessment_scv=1.0):
+        self.base_params = Run_Parameters.from_class(parameter_class)
+        self.arrival_scv = arrival_scv
+        self.registration_scv = registration_scv
+        self.triage_scv = triage_scv
+        self.ed_assessment_scv = ed_assessment_scv
+        self.acu_assessment_scv = acu_assessment_scv
+
+    # A method to approximate a single queue, giving back the mean queuing
+    # time, the utilisation, and the variability of the times between
+    # patients leaving it
+    def approximate_station(self, arrival_rate, arrival_scv,
+                            mean_service_time, service_scv, servers):
+        utilisation = arrival_rate * mean_service_time / servers
+
+        mean_queuing_time = allen_cunneen_mean_queuing_time(
+            arrival_rate, mean_service_time, servers, arrival_scv,
+            service_scv)
+
+        if utilisation >= 1:
+            return mean_queuing_time, utilisation, service_scv
+
+        return (mean_queuing_time, utilisation,
+                departure_scv(arrival_scv, service_scv, utilisation,
+                              servers))
+
+    # A method to approximate the results for a single configuration (a
+    # dictionary of the parameter values it changes, as used by the scenario
+    # engine).  The results use the same names as the simulation's results,
+    # so the two can be compared directly.  We also give the overall mean
+    # queuing time per patient (over all the queues they go through).
+    def evaluate(self, configuration=None):
+        return self.evaluate_params(
+            self.base_params.replace(**(configuration or {})))
+
+    # A method to approximate the results for a full set of Run_Parameters
+    def evaluate_params(self, params):
+        arrival_rate = 1 / params.ed_inter
+
+        q_time_reg, utilisation_reg, reg_departure_scv = (
+            self.approximate_station(arrival_rate, self.arrival_scv,
+                                     params.mean_register,
+                                     self.registration_scv,
+                                     params.number_of_receptionists))
+
+        q_time_triage, utilisation_triage, triage_departure_scv = (
+            self.approximate_station(arrival_rate, reg_departure_scv,
+                                     params.mean_triage, self.triage_scv,
+                                     params.number_of_nurses))
+
+        acu_arrival_rate = arrival_rate * params.prob_acu
+        acu_arrival_scv = (params.prob_acu * triage_departure_scv + 1 -
+                           params.prob_acu)
+
+        ed_arrival_rate = arrival_rate * (1 - params.prob_acu)
+        ed_arrival_scv = ((1 - params.prob_acu) * triage_departure_scv +
+                          params.prob_acu)
+
+        q_time_ed_assess, utilisation_ed, _ = self.approximate_station(
+            ed_arrival_rate, ed_arrival_scv, params.mean_ed_assess,
+            self.ed_assessment_scv, params.number_of_ed_doctors)
+
+        q_time_acu_assess, utilisation_acu, _ = self.approximate_station(
+            acu_arrival_rate, acu_arrival_scv, params.mean_acu_assess,
+            self.acu_assessment_scv, params.number_of_acu_doctors)
+
+        mean_total_q_time = (q_time_reg + q_time_triage +
+                             (1 - params.prob_acu) * q_time_ed_assess +
+                             params.prob_acu * q_time_acu_assess)
+
+        return {"Mean_Q_Time_Registration":q_time_reg,
+                "Mean_Q_Time_Triage":q_time_triage,
+                "Mean_Q_Time_ED_Assessment":q_time_ed_assess,
+                "Mean_Q_Time_ACU_Assessment":q_time_acu_assess,
+                "Mean_Total_Q_Time":mean_total_q_time,
+                "Utilisation_Receptionist":utilisation_reg,
+                "Utilisation_Nurse":utilisation_triage,
+                "Utilisation_ED_Doctor":utilisation_ed,
+                "Utilisation_ACU_Doctor":utilisation_acu}
+
+    # A method to evaluate a list of configurations (eg from
+    # full_grid_design in the scenario engine) and rank them.  Each staff
+    # group can be given a cost (eg {"number_of_ed_doctors":100}); the cost
+    # of a configuration is the sum of the number of each staff group x its
+    # cost.  Configurations where any queue would keep growing come last.
+    # The rest are ranked by the overall mean queuing time, or, if we give a
+    # maximum mean queuing time, we rank those that meet it by cost (with
+    # those that don't meet it after them).
+    def rank_configurations(self, configurations, staff_costs=None,
+                            max_mean_total_q_time=None):
+        staff_costs = staff_costs or {}
+
+        results_rows = []
+
+        for configuration in configurations:
+            params = self.base_params.replace(**configuration)
+
+            results_row = dict(configuration)
+            results_row.update(self.evaluate_params(params))
+
+            results_row["Cost"] = sum(getattr(params, name) * cost
+                                      for name, cost in staff_costs.items())
+            results_row["Stable"] = not math.isinf(
+                results_row["Mean_Total_Q_Time"])
+
+            if max_mean_total_q_time is None:
+                results_row["Meets_Target"] = results_row["Stable"]
+            else:
+                results_row["Meets_Target"] = (
+                    results_row["Mean_Total_Q_Time"] <= max_mean_total_q_time)
+
+            results_rows.append(results_row)
+
+        ranking_df = pd.DataFrame(results_rows)
+
+        if max_mean_total_q_time is None:
+            sort_columns = ["Stable", "Mean_Total_Q_Time", "Cost"]
+        else:
+            sort_columns = ["Meets_Target", "Cost", "Mean_Total_Q_Time"]
+
+        ranking_df = ranking_df.sort_values(
+            sort_columns, ascending=[False, True, True], kind="stable")
+        ranking_df = ranking_df.reset_index(drop=True)
+        ranking_df.index.name = "Rank"
+
+        return ranking_df
+
+# Example - screen every combination of up to 2 receptionists, 4 nurses, 8 ED
+# doctors and 4 ACU doctors for the ED model from exercise 1, then run the
+# full simulation for the 5 cheapest that the approximation says keep the
+# mean queuing time under 30 minutes
+if __name__ == "__main__":
+    import time
+    from exercise_1_solution import ED_Model, g
+    from scenario_engine import Scenario_Engine, full_grid_design
+
+    configurations = full_grid_design(number_of_receptionists=[1, 2],
+                                      number_of_nurses=[1, 2, 3, 4],
+                                      number_of_ed_doctors=list(range(1, 9)),
+                                      number_of_acu_doctors=[1, 2, 3, 4])
+    staff_costs = {"number_of_receptionists":25, "number_of_nurses":40,
+                   "number_of_ed_doctors":100, "number_of_acu_doctors":100}
+
+    approximation = Queueing_Network_Approximation(g)
+
+    start_time = time.perf_counter()
+    ranking_df = approximation.rank_configurations(
+        configurations, staff_costs, max_mean_total_q_time=30)
+    screening_time = time.perf_counter() - start_time
+
+    print ("Screened ", len(configurations), " configurations in ",
+           round(1000 * screening_time, 1), " ms", sep="")
+
+    shortlist = ranking_df[ranking_df["Meets_Target"]].head(5)
+
+    with pd.option_context("display.width", 120,
+                           "display.max_columns", None):
+        print (shortlist.round(2))
+
+    staffing_columns = list(configurations[0])
+
+    my_scenario_engine = Scenario_Engine(ED_Model, g, number_of_runs=20)
+    results_df = my_scenario_engine.run_scenarios(
+        shortlist[staffing_columns].to_dict("records"))
+
+    with pd.option_context("display.width", 120,
+                           "display.max_columns", None):
+        print (my_scenario_engine.summarise(results_df)[
+            staffing_columns + ["Mean_Q_Time_ED_Assessment",
+                                "Mean_Q_Time_ACU_Assessment"]].round(2))
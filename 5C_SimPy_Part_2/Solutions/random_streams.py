@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+# Class to hold a separate random number generator for each random process in
+# a model (eg one for inter-arrival times, one for triage durations and so
+# on).  All of the generators are created from a single seed, using NumPy's
+# SeedSequence to spawn an independent child seed for each one.
+#
+# Why bother?  If every random process draws from the same generator, then
+# changing one part of the model (eg adding a nurse) changes which random
+# numbers every other process gets, too.  With a stream per process, two
+# scenarios run with the same seed see the same arrivals, the same triage
+# times and so on - they only differ where the scenarios actually differ.
+# This is known as using Common Random Numbers (CRN), and it means the
+# difference between two scenarios can be estimated with far fewer runs.
+#
+# Each generator is available as an attribute named after its stream, eg
+# streams.arrivals.exponential(8).  Streams are matched up between models by
+# their position in the list of names, so add any new streams to the end of
+# the list, rather than the middle, if you want to keep earlier results.
+class Random_Streams:
+    def __init__(self, seed, stream_names):
+        self.seed = seed
+        self.stream_names = list(stream_names)
+
+        child_seeds = np.random.SeedSequence(seed).spawn(
+            len(self.stream_names))
+
+        for name, child_seed in zip(self.stream_names, child_seeds):
+            setattr(self, name, np.random.default_rng(child_seed))
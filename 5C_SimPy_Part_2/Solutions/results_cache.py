@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import inspect
+import json
+import os
+import sys
+import pandas as pd
+
+# Function to work out a "version" for a model's code - a hash of the source
+# code of the file the model class is in, along with every file in the same
+# folder that it uses (eg variate_pool.py or monitored_resource.py), and any
+# files those use in turn.  If any of them change, so does the version.
+# Changes to files elsewhere (eg SimPy or NumPy being upgraded) aren't picked
+# up, so clear the cache (delete its folder) if you change those.
+def model_code_version(model_class):
+    model_module = sys.modules[model_class.__module__]
+    model_folder = os.path.dirname(os.path.abspath(model_module.__file__))
+
+    modules_to_check = [model_module]
+    source_files = set()
+
+    while modules_to_check:
+        module = modules_to_check.pop()
+        source_file = os.path.abspath(module.__file__)
+
+        if source_file in source_files:
+            continue
+
+        source_files.add(source_file)
+
+        # Look at everything the module has imported or defined, and follow
+        # anything that comes from another file in the model's folder
+        for value in list(vars(module).values()):
+            value_module = inspect.getmodule(value)
+
+            if (value_module is not None and
+                    getattr(value_module, "__file__", None) is not None and
+                    os.path.dirname(os.path.abspath(
+                        value_module.__file__)) == model_folder):
+                modules_to_check.append(value_module)
+
+    code_hash = hashlib.sha256()
+
+    for source_file in sorted(source_files):
+        code_hash.update(os.path.basename(source_file).encode())
+
+        with open(source_file, "rb") as code_file:
+            code_hash.update(code_file.read())
+
+    return code_hash.hexdigest()
+
+# Class to keep the results of every run we've done on disk, so asking for
+# the same run again (eg re-running a trial whilst working on a report) gives
+# back the saved results straight away rather than running the model.
+#
+# Each run is saved under a key that's a hash of everything that decides its
+# results - the model class and the version of its code, the full set of
+# parameters, the run number and the seed.  If any of these change, we get a
+# different key, so we can never get back results that are out of date - we
+# never need to tell the cache that something has changed.  As run i of a
+# trial always gets the same seed for the same base seed, a trial of 100 runs
+# can reuse the first 50 runs of an earlier trial of 50 runs.
+#
+# The results of each run are saved as a small Parquet file (which needs the
+# pyarrow package), named after its key, in the cache folder.  Files are
+# written to a temporary name first and then renamed, so a trial that's
+# stopped partway through can't leave a half written file in the cache.
+class Results_Cache:
+    def __init__(self, cache_folder="results_cache"):
+        self.cache_folder = cache_folder
+        self.code_versions = {}
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(cache_folder, exist_ok=True)
+
+    # A method to work out the key for a run.  The run needs to be given the
+    # parameters it will use (map_replications in trial_runner.py does this
+    # for us, with a copy of the model's g class if we didn't give any), so
+    # the key always matches what the run actually does.
+    def run_key(self, model_class, run_number, seed, params=None):
+        if params is None:
+            raise ValueError("The results cache needs the parameters for "
+                             "each run - run it through map_replications, "
+                             "or give " + model_class.__qualname__ +
+                             " a set of Run_Parameters")
+
+        if model_class not in self.code_versions:
+            self.code_versions[model_class] = model_code_version(model_class)
+
+        run_description = {"Model":model_class.__module__ + "." +
+                           model_class.__qualname__,
+                           "Code_Version":self.code_versions[model_class],
+                           "Params":repr(params),
+                           "Run":run_number,
+                           "Seed":seed}
+
+        return hashlib.sha256(json.dumps(run_description,
+                                         sort_keys=True).encode()).hexdigest()
+
+    def filename(self, key):
+        return os.path.join(self.cache_folder, key + ".parquet")
+
+    # A method to get the saved results of a run, or None if we haven't got
+    # them
+    def load(self, model_class, run_number, seed, params=None):
+        filename = self.filename(self.run_key(model_class, run_number, seed,
+                                              params))
+
+        if not os.path.exists(filename):
+            self.misses += 1
+
+            return None
+
+        self.hits += 1
+
+        return pd.read_parquet(filename).to_dict("records")[0]
+
+    # A method to save the results of a run
+    def save(self, model_class, run_number, seed, params, run_results):
+        filename = self.filename(self.run_key(model_class, run_number, seed,
+                                              params))
+        temporary_filename = filename + ".tmp"
+
+        pd.DataFrame([run_results]).to_parquet(temporary_filename,
+                                               index=False)
+        os.replace(temporary_filename, filename)
+
+# Example - run a trial of the ED model from exercise 1 twice with the same
+# base seed.  The first time, the runs are done and saved in the cache; the
+# second time, they all come straight from the cache.
+if __name__ == "__main__":
+    import time
+    from exercise_1_solution import ED_Model
+    from trial_runner import Trial_Runner
+
+    my_cache = Results_Cache()
+
+    for attempt in range(2):
+        start_time = time.perf_counter()
+
+        my_trial_runner = Trial_Runner(ED_Model, 20, base_seed=42,
+                                       cache=my_cache)
+        trial_results = my_trial_runner.run_trial()
+
+        print ("Trial ", attempt + 1, " took ",
+               round(time.perf_counter() - start_time, 2), "s (",
+               my_cache.hits, " runs from the cache so far) - mean ED "
+               "assessment queuing time : ",
+               round(trial_results.mean("Mean_Q_Time_ED_Assessment"), 2),
+               sep="")
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from monitored_resource import Monitored_Resource, Monitored_Priority_Resource
+from simulation_logger import get_simulation_logger
+
+# The logger for messages about roster changes (switched off unless we switch
+# it on - see simulation_logger.py).  Roster changes are rare, so we don't
+# need to avoid the (small) cost of checking whether it's on each time.
+logger = get_simulation_logger("rostered_resource")
+
+# Class that lets the capacity of a (monitored) SimPy resource change at set
+# times, following a roster (shift table).  The roster is a list of (time,
+# capacity) pairs, in time order and starting at time 0 - eg [(0, 3), (480,
+# 2), (1200, 3)] means 3 on duty from the start, 2 from time 480 and 3 again
+# from time 1200.  If we give a cycle length, the roster repeats (eg a daily
+# roster would have a cycle length of 1440 minutes); otherwise the last
+# capacity stays in place for the rest of the run.
+#
+# Each change is scheduled as a single timeout event, which changes the
+# capacity as soon as it happens and then schedules the next change.  There's
+# no extra process or request involved (unlike "obstructing" a resource by
+# having a dummy entity request it).  When the capacity goes up, anyone
+# waiting is let in straight away.  When it goes down, anyone already being
+# seen carries on until they're finished, but nobody new is let in until the
+# number in use has dropped below the new capacity.  A capacity of 0 (eg
+# nobody on duty overnight) is allowed.  For the utilisation, anyone
+# finishing off after the capacity has gone down (overrunning their shift) is
+# counted as available until they're done (see Resource_Monitor).
+#
+# We don't use this class on its own - we combine it with one of the
+# monitored resource classes (see Rostered_Resource and
+# Rostered_Priority_Resource below).
+class Resource_Roster:
+    def __init__(self, env, roster, cycle_length=None,
+                 statistics_start_time=0):
+        self.roster = sorted(roster)
+
+        if not self.roster or self.roster[0][0] != 0:
+            raise ValueError("The roster needs to start at time 0")
+
+        if cycle_length is not None and self.roster[-1][0] >= cycle_length:
+            raise ValueError("All roster times need to be before the end of "
+                             "the cycle")
+
+        # SimPy won't let us set up a resource with a capacity of 0, so we
+        # set it up with a capacity of 1 and then set the real capacity
+        super().__init__(env, capacity=1,
+                         statistics_start_time=statistics_start_time)
+        self._capacity = self.roster[0][1]
+
+        self.cycle_length = cycle_length
+        self.cycle_start_time = 0
+        self.next_change = 1
+
+        self.schedule_next_change()
+
+    # A method to schedule the next change in the roster, as a timeout event
+    # that calls change_capacity when it happens
+    def schedule_next_change(self):
+        if self.next_change == len(self.roster):
+            if self.cycle_length is None:
+                return
+
+            # Go back to the start of the roster for the next cycle
+            self.cycle_start_time += self.cycle_length
+            self.next_change = 0
+
+        change_time = (self.cycle_start_time +
+                       self.roster[self.next_change][0])
+
+        change_event = self._env.timeout(change_time - self._env.now)
+        change_event.callbacks.append(self.change_capacity)
+
+    # A method that's called when a change in the roster happens
+    def change_capacity(self, change_event):
+        self.update_statistics()
+
+        logger.debug("Roster change at time %.1f : capacity %d -> %d "
+                     "(%d in use, %d waiting)", self._env.now, self._capacity,
+                     self.roster[self.next_change][1], len(self.users),
+                     len(self.put_queue))
+
+        self._capacity = self.roster[self.next_change][1]
+        self.next_change += 1
+
+        # Let in anyone who's waiting, if there's now room for them (SimPy
+        # only lets in one waiting request each time we ask it to, as
+        # normally only one place becomes free at a time)
+        while self.put_queue and len(self.users) < self.capacity:
+            self._trigger_put(None)
+
+        self.schedule_next_change()
+
+# A monitored SimPy Resource with a roster
+class Rostered_Resource(Resource_Roster, Monitored_Resource):
+    pass
+
+# A monitored SimPy PriorityResource with a roster
+class Rostered_Priority_Resource(Resource_Roster, Monitored_Priority_Resource):
+    pass
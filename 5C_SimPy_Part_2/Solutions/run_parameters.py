@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Function to turn a list (or a list of lists, or a NumPy array) into a tuple
+# (or a tuple of tuples), so it can't be changed and can be hashed.  Anything
+# else is given back as it is.
+def make_unchangeable(value):
+    # NumPy arrays have a tolist method that gives back plain Python values
+    if hasattr(value, "tolist") and hasattr(value, "shape"):
+        value = value.tolist()
+
+    if isinstance(value, (list, tuple)):
+        return tuple(make_unchangeable(item) for item in value)
+
+    return value
+
+# Class to hold the parameter values for a single run of a model.  It works
+# just like the g class (we get values with eg params.number_of_nurses), but
+# once it's been created, its values can't be changed.  This means many runs
+# with different parameter values can be set up side by side, or sent to
+# different worker processes, without one run accidentally changing the
+# values another run is using (which can easily happen when every run shares
+# the one g class).  To get a set of parameters with some values changed, we
+# use the replace method, which gives back a new copy.
+#
+# As they can't be changed, two sets of parameters with the same values are
+# treated as equal, and can be used as dictionary keys (eg for remembering
+# which scenarios we've already run).  For this to work, any lists of values
+# (eg an arrival rate for each hour of the week in arrival_rate_profile), or
+# NumPy arrays, are turned into tuples (which can't be changed) when the
+# parameters are created.
+class Run_Parameters:
+    def __init__(self, **values):
+        values = {name:make_unchangeable(value)
+                  for name, value in values.items()}
+
+        object.__setattr__(self, "_values", values)
+
+    # A method to create a set of parameters from the values in a class like
+    # the g class, optionally changing some of the values.  We take every
+    # attribute of the class that doesn't start with an underscore and isn't
+    # a method
+    @classmethod
+    def from_class(cls, parameter_class, **changes):
+        values = {name:value for name, value in vars(parameter_class).items()
+                  if not name.startswith("_") and not callable(value)}
+
+        for name in changes:
+            if name not in values:
+                raise AttributeError("Unknown parameter : " + name)
+
+        values.update(changes)
+
+        return cls(**values)
+
+    # A method to get a new copy of these parameters, with some values changed
+    def replace(self, **changes):
+        for name in changes:
+            if name not in self._values:
+                raise AttributeError("Unknown parameter : " + name)
+
+        values = dict(self._values)
+        values.update(changes)
+
+        return Run_Parameters(**values)
+
+    def as_dict(self):
+        return dict(self._values)
+
+    def __getattr__(self, name):
+        # _values is looked up here if it hasn't been set yet (eg whilst the
+        # object is being unpickled), so stop it looking for itself forever
+        if name == "_values":
+            raise AttributeError(name)
+
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError("Unknown parameter : " + name) from None
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Run parameters can't be changed - use replace() "
+                             "to get a copy with different values")
+
+    def __eq__(self, other):
+        return (isinstance(other, Run_Parameters) and
+                self._values == other._values)
+
+    def __hash__(self):
+        return hash(tuple(sorted(self._values.items())))
+
+    def __repr__(self):
+        return ("Run_Parameters(" +
+                ", ".join(name + "=" + repr(value) for name, value in
+                          sorted(self._values.items())) + ")")
+
+    # These let the parameters be pickled (which is how they're sent to
+    # worker processes)
+    def __getstate__(self):
+        return self._values
+
+    def __setstate__(self, values):
+        object.__setattr__(self, "_values", values)
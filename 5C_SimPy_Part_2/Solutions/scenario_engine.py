@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import itertools
+import os
+import numpy as np
+import pandas as pd
+from run_parameters import Run_Parameters
+from trial_runner import generate_run_seeds, map_replications
+
+# Function to create a full grid of scenarios - every combination of the
+# values given for each parameter.  eg full_grid_design(number_of_nurses=[2,3],
+# ed_inter=[6,8]) gives four scenarios.  Each scenario is a dictionary of the
+# parameter values it changes.
+def full_grid_design(**parameter_levels):
+    names = list(parameter_levels)
+
+    return [dict(zip(names, values)) for values in
+            itertools.product(*parameter_levels.values())]
+
+# Function to create a Latin hypercube design - a set of scenarios spread
+# evenly over the ranges given for each parameter, which covers the ranges far
+# better than picking the same number of scenarios at random.  Each range is
+# split into as many equal slices as we want scenarios, and each scenario takes
+# a random value from a different slice for each parameter (with the slices
+# shuffled independently for each parameter).  If both ends of a range are
+# whole numbers (eg numbers of staff), the values are rounded to whole numbers
+# (we stretch the range by a half at each end first, so the end values are as
+# likely to come up as the values in the middle).
+def latin_hypercube_design(number_of_scenarios, parameter_ranges, seed=None):
+    rng = np.random.default_rng(seed)
+
+    scenarios = [{} for i in range(number_of_scenarios)]
+
+    for name, (low, high) in parameter_ranges.items():
+        whole_numbers = isinstance(low, int) and isinstance(high, int)
+
+        if whole_numbers:
+            low = low - 0.5
+            high = high + 0.5
+
+        slices = rng.permutation(number_of_scenarios)
+        points = (slices + rng.uniform(size=number_of_scenarios)) / (
+            number_of_scenarios)
+        values = low + points * (high - low)
+
+        for scenario, value in zip(scenarios, values):
+            if whole_numbers:
+                scenario[name] = int(round(value))
+            else:
+                scenario[name] = float(value)
+
+    return scenarios
+
+# Class to run a model over many scenarios.  Every run of every scenario is
+# handed out to the pool of worker processes at once, so the workers stay busy
+# until the whole design is finished.  Each scenario is turned into its own
+# set of Run_Parameters (the base parameters with the scenario's changes), so
+# scenarios can't interfere with each other.  Run i of every scenario uses the
+# same seed, so scenarios are compared using common random numbers.
+#
+# Results for each scenario are kept once they've been run, so asking for a
+# scenario again (eg as part of a bigger grid) doesn't run it again.  If we
+# give a Results_Cache (see results_cache.py), the results are also kept on
+# disk, so they're there next time too.
+#
+# If we give a set of Run_Parameters (eg the ones from apply_warm_up_period
+# in warm_up_analysis.py), the scenarios are changes to those, rather than to
+# the values in the parameter class.
+class Scenario_Engine:
+    def __init__(self, model_class, parameter_class, number_of_runs,
+                 base_seed=None, max_workers=None, cache=None, params=None):
+        self.model_class = model_class
+        self.cache = cache
+
+        if params is None:
+            params = Run_Parameters.from_class(parameter_class)
+
+        self.base_params = params
+        self.number_of_runs = number_of_runs
+
+        if max_workers is None:
+            max_workers = os.cpu_count()
+
+        self.max_workers = max_workers
+
+        self.base_seed, self.run_seeds = generate_run_seeds(number_of_runs,
+                                                            base_seed)
+
+        # Dictionary of the results of each scenario that's been run, keyed by
+        # its Run_Parameters.  Each entry is a list of run results
+        self.completed_scenarios = {}
+
+    # A method to run a list of scenarios (as given by full_grid_design or
+    # latin_hypercube_design), and return a tidy DataFrame of the results -
+    # one row per run of each scenario, with a column for each parameter that
+    # the scenarios change, followed by the Run and a column for each KPI
+    def run_scenarios(self, scenarios):
+        list_of_params = [self.base_params.replace(**scenario)
+                          for scenario in scenarios]
+
+        # Work out which scenarios still need running (leaving out any that
+        # appear twice in the list)
+        params_to_run = []
+
+        for params in list_of_params:
+            if (params not in self.completed_scenarios and
+                    params not in params_to_run):
+                params_to_run.append(params)
+
+        list_of_arguments = [(self.model_class, run, seed, params)
+                             for params in params_to_run
+                             for run, seed in enumerate(self.run_seeds)]
+
+        for params in params_to_run:
+            self.completed_scenarios[params] = []
+
+        for (model_class, run, seed, params), run_results in zip(
+                list_of_arguments, map_replications(list_of_arguments,
+                                                    self.max_workers,
+                                                    cache=self.cache)):
+            self.completed_scenarios[params].append(run_results)
+
+        # Build the results table
+        parameter_names = []
+
+        for scenario in scenarios:
+            for name in scenario:
+                if name not in parameter_names:
+                    parameter_names.append(name)
+
+        results_rows = []
+
+        for scenario_number, params in enumerate(list_of_params):
+            for run_results in self.completed_scenarios[params]:
+                results_row = {"Scenario":scenario_number}
+
+                for name in parameter_names:
+                    results_row[name] = getattr(params, name)
+
+                results_row.update(run_results)
+                results_rows.append(results_row)
+
+        return pd.DataFrame(results_rows)
+
+    # A method to summarise a results table from run_scenarios, giving the
+    # mean of each KPI over the runs of each scenario
+    def summarise(self, results_df):
+        grouping_columns = [column for column in results_df.columns
+                            if column not in self.kpi_columns(results_df)]
+        grouping_columns.remove("Run")
+
+        return results_df.groupby(grouping_columns).mean().drop(
+            columns="Run").reset_index()
+
+    # A method to work out which columns of a results table are KPIs (the
+    # columns after the Run column)
+    def kpi_columns(self, results_df):
+        columns = list(results_df.columns)
+
+        return columns[columns.index("Run") + 1:]
+
+# Example - sweep the number of ED and ACU doctors in the ED model from
+# exercise 1, along with the mean time between arrivals
+if __name__ == "__main__":
+    from exercise_1_solution import ED_Model, g
+
+    my_scenario_engine = Scenario_Engine(ED_Model, g, number_of_runs=20)
+
+    scenarios = full_grid_design(number_of_ed_doctors=[3, 4, 5],
+                                 number_of_acu_doctors=[1, 2],
+                                 ed_inter=[8, 10])
+
+    results_df = my_scenario_engine.run_scenarios(scenarios)
+
+    with pd.option_context("display.width", 120,
+                           "display.max_columns", None):
+        print (my_scenario_engine.summarise(results_df).round(2))
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import collections
+import logging
+import sys
+
+# The models log what each patient is doing (eg "Patient 12 with priority 3
+# waiting for ACU doctor") using Python's standard logging module, rather
+# than printing it.  Printing every message in a trial of hundreds of runs
+# takes far longer than the simulation itself, and nobody reads it.
+#
+# The messages are logged at the DEBUG level to a logger called
+# "simpy_models" (or one underneath it, eg "simpy_models.rostered_resource"),
+# which is switched off unless we switch it on.  When it's off, a model
+# doesn't even build the messages - each model checks whether the logger is
+# on once, when it's set up, and skips its logging with a single "if" after
+# that.  The messages are
+# also given as a format string and values (eg "Patient %d waiting",
+# patient.id), so even when logging is on, a message is only turned into
+# text if a handler actually needs it.
+#
+# This file is shared by the models in this folder.  The SimPy examples in
+# 5A and 5B (eg simple_simpy.py and simpy_8.py) are run on their own from
+# their own folders, so they can't import it - instead they each have their
+# own short switch_on_logging function.  They do log to loggers under the
+# same "simpy_models" name, with their messages shown on the screen in the
+# same way, so if they're imported into the same program as these models
+# (eg the benchmarks), switching logging on here covers them too.
+SIMULATION_LOGGER_NAME = "simpy_models"
+
+def get_simulation_logger(name=None):
+    if name is None:
+        return logging.getLogger(SIMULATION_LOGGER_NAME)
+
+    return logging.getLogger(SIMULATION_LOGGER_NAME + "." + name)
+
+# Class for a logging handler that keeps only the most recent messages (by
+# default, the last 10,000) in memory, in a "ring buffer" - once it's full,
+# each new message pushes out the oldest one.  This lets us keep the log on
+# during a long run without it using more and more memory, and look at what
+# happened just before something went wrong.  The messages are kept as they
+# were logged, and only turned into text when we ask for them.
+class Ring_Buffer_Handler(logging.Handler):
+    def __init__(self, capacity=10000, level=logging.NOTSET):
+        super().__init__(level)
+        self.buffer = collections.deque(maxlen=capacity)
+
+    def emit(self, record):
+        self.buffer.append(record)
+
+    # A method to get the messages in the buffer as text, oldest first
+    def messages(self):
+        return [self.format(record) for record in self.buffer]
+
+    # A method to write the messages in the buffer out (to the screen, by
+    # default)
+    def dump(self, stream=None):
+        stream = stream or sys.stdout
+
+        for message in self.messages():
+            stream.write(message + "\n")
+
+    def clear(self):
+        self.buffer.clear()
+
+# Function to switch on the models' log messages.  By default they're
+# printed to the screen as they happen; if we give a ring buffer size, the
+# most recent messages are kept in a Ring_Buffer_Handler instead.  We get
+# back the handler, so we can look at the buffer (or remove the handler
+# again with switch_off_simulation_logging).  Models check whether logging is
+# on when they're set up, so this needs to be called before the model is
+# created.
+def switch_on_simulation_logging(level=logging.DEBUG, ring_buffer_size=None):
+    if ring_buffer_size is None:
+        handler = logging.StreamHandler(sys.stdout)
+    else:
+        handler = Ring_Buffer_Handler(ring_buffer_size)
+
+    handler.setFormatter(logging.Formatter("%(message)s"))
+
+    logger = get_simulation_logger()
+    logger.addHandler(handler)
+    logger.setLevel(level)
+
+    return handler
+
+# Functions to give worker processes (eg those doing the runs of a trial) the
+# same logging as this process.  A worker started from scratch (which is how
+# they're started on Windows and macOS) doesn't know we've switched logging
+# on, so we pass set_up_worker_logging and the level from
+# simulation_logging_level to the ProcessPoolExecutor, to be run in each
+# worker when it starts (see start_worker_pool in trial_runner.py).
+# Messages in a worker are always shown on the screen (a ring buffer in a
+# worker couldn't be looked at from here).  A worker that's a copy of this
+# process (as on Linux) already has the same logging, so we leave it alone.
+def simulation_logging_level():
+    return get_simulation_logger().getEffectiveLevel()
+
+def set_up_worker_logging(level):
+    logger = get_simulation_logger()
+
+    if level < logging.WARNING and not logger.handlers:
+        switch_on_simulation_logging(level)
+
+def switch_off_simulation_logging(handler=None):
+    logger = get_simulation_logger()
+
+    if handler is not None:
+        logger.removeHandler(handler)
+
+    logger.setLevel(logging.WARNING)
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import math
+import os
+import pandas as pd
+from run_parameters import Run_Parameters
+from trial_results_aggregator import Trial_Results_Aggregator
+from trial_runner import (generate_run_seeds, map_replications,
+                          start_worker_pool)
+
+# Class to find the cheapest mix of staff that meets a set of targets for the
+# mean queuing times (eg a mean wait for ED assessment of no more than an
+# hour), using the simulation itself to check each staffing mix.
+#
+# Running every staffing mix for a fixed (large) number of runs wastes most of
+# the runs - a mix that's nowhere near meeting the targets, or easily meets
+# them, is obvious after a handful of runs.  So instead we "race" the mixes
+# against each other : each mix in the race starts with a few runs, and then
+# every round, each mix still in the race gets another batch of runs.  A mix
+# drops out of the race as soon as the confidence interval for each target
+# KPI is clear of its target (all below their targets means the mix is
+# feasible; any above means it isn't).  So the runs are shared out between
+# the mixes as we go - mixes that are close to their targets keep getting
+# runs, and the rest drop out after very few.  If a mix is still in the race
+# after max_runs_per_candidate runs, we decide on its means.
+#
+# The mixes join the race from the cheapest up, race_size at a time (when
+# one drops out, the next cheapest joins), and all of the runs for a round
+# are handed to the workers together, so they're kept busy.  A bigger race
+# keeps more workers busy, but spends more runs on mixes that turn out to be
+# more expensive than the answer, so by default the race is just big enough
+# for its first round of runs to give every worker something to do (and
+# never fewer than 2 mixes).  Once a mix is
+# feasible, nothing more expensive can be the answer, so those mixes are
+# dropped from the race (and never join it).  We stop when every mix cheaper
+# than the cheapest feasible mix has been shown to be infeasible - so the
+# answer is always the cheapest feasible mix.
+#
+# Run i of every mix uses the same seed (common random numbers), so the mixes
+# are compared on the same patients.  If we give a Results_Cache, runs that
+# have been done before are taken from it.
+#
+# staff_costs gives the cost of one of each staff group we're choosing (eg
+# {"number_of_nurses":40, "number_of_ed_doctors":100}) and wait_targets the
+# highest mean we'll accept for each KPI (eg
+# {"Mean_Q_Time_ED_Assessment":60}).
+class Staffing_Optimiser:
+    def __init__(self, model_class, parameter_class, staff_costs,
+                 wait_targets, initial_runs=5, batch_size=5,
+                 max_runs_per_candidate=100, confidence=0.95, race_size=None,
+                 base_seed=None, max_workers=None, cache=None):
+        self.model_class = model_class
+        self.base_params = Run_Parameters.from_class(parameter_class)
+        self.staff_costs = staff_costs
+        self.wait_targets = wait_targets
+        self.initial_runs = max(2, initial_runs)
+        self.batch_size = batch_size
+        self.max_runs_per_candidate = max_runs_per_candidate
+        self.confidence = confidence
+        self.cache = cache
+
+        if max_workers is None:
+            max_workers = os.cpu_count()
+
+        self.max_workers = max_workers
+
+        if race_size is None:
+            race_size = max(2, math.ceil(max_workers / self.initial_runs))
+
+        self.race_size = race_size
+
+        self.base_seed, self.run_seeds = generate_run_seeds(
+            max_runs_per_candidate, base_seed)
+
+        # A list with a row for each mix we've looked at, and the total
+        # number of runs done
+        self.candidate_log = []
+        self.total_runs = 0
+
+    def cost(self, configuration):
+        params = self.base_params.replace(**configuration)
+
+        return sum(getattr(params, name) * cost
+                   for name, cost in self.staff_costs.items())
+
+    # A method to check the results so far for a mix against the targets.
+    # We give back "Feasible", "Infeasible" or (if we can't tell yet)
+    # "Undecided".  Once we've done all the runs we're allowed, we decide on
+    # the means alone, and a KPI with no mean at all (NaN - eg no patients
+    # got to that queue in any run) counts as missing its target, so we
+    # always reach a decision.
+    def classify(self, trial_results):
+        all_runs_done = (trial_results.number_of_runs >=
+                         self.max_runs_per_candidate)
+        all_below_target = True
+
+        for kpi, target in self.wait_targets.items():
+            lower_ci, upper_ci = trial_results.confidence_interval(
+                kpi, self.confidence)
+
+            if all_runs_done:
+                lower_ci = upper_ci = trial_results.mean(kpi)
+
+                if math.isnan(lower_ci):
+                    return "Infeasible"
+
+            if lower_ci > target:
+                return "Infeasible"
+
+            if not upper_ci <= target:
+                all_below_target = False
+
+        if all_below_target:
+            return "Feasible"
+
+        return "Undecided"
+
+    # A method to do one round of the race - the next batch of runs for each
+    # mix in the race (given as their positions in the list of mixes), all
+    # handed out to the workers together
+    def run_round(self, racing, list_of_params, list_of_trial_results,
+                  executor=None):
+        list_of_arguments = []
+        owners = []
+
+        for candidate in racing:
+            runs_done = list_of_trial_results[candidate].number_of_runs
+
+            if runs_done == 0:
+                runs_to_do = self.initial_runs
+            else:
+                runs_to_do = self.batch_size
+
+            runs_to_do = min(runs_to_do,
+                             self.max_runs_per_candidate - runs_done)
+
+            for run in range(runs_done, runs_done + runs_to_do):
+                list_of_arguments.append((self.model_class, run,
+                                          self.run_seeds[run],
+                                          list_of_params[candidate]))
+                owners.append(candidate)
+
+        for candidate, run_results in zip(
+                owners, map_replications(list_of_arguments, self.max_workers,
+                                         executor, self.cache)):
+            list_of_trial_results[candidate].add_run_results(run_results)
+
+        self.total_runs += len(list_of_arguments)
+
+    # A method to search a list of mixes (eg from full_grid_design in the
+    # scenario engine - each a dictionary of the number of each staff group),
+    # and give back the cheapest that meets the targets (or None if none do)
+    def optimise(self, configurations):
+        configurations = sorted(configurations, key=self.cost)
+        list_of_params = [self.base_params.replace(**configuration)
+                          for configuration in configurations]
+        list_of_trial_results = [Trial_Results_Aggregator()
+                                 for configuration in configurations]
+        decisions = ["Undecided"] * len(configurations)
+
+        # The position of the cheapest feasible mix we've found so far, the
+        # mixes in the race, and the next mix to join it
+        best_candidate = len(configurations)
+        racing = []
+        next_candidate = 0
+
+        if self.max_workers == 1:
+            executor = None
+        else:
+            executor = start_worker_pool(self.max_workers)
+
+        try:
+            while True:
+                while (len(racing) < self.race_size and
+                       next_candidate < best_candidate):
+                    racing.append(next_candidate)
+                    next_candidate += 1
+
+                if not racing:
+                    break
+
+                self.run_round(racing, list_of_params, list_of_trial_results,
+                               executor)
+
+                for candidate in racing:
+                    decisions[candidate] = self.classify(
+                        list_of_trial_results[candidate])
+
+                    if decisions[candidate] == "Feasible":
+                        best_candidate = min(best_candidate, candidate)
+
+                racing = [candidate for candidate in racing
+                          if decisions[candidate] == "Undecided" and
+                          candidate < best_candidate]
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        # Log every mix that joined the race, cheapest first.  Mixes that
+        # were dropped because a cheaper mix was feasible are left as
+        # Undecided.
+        for candidate in range(next_candidate):
+            log_row = dict(configurations[candidate])
+            log_row["Cost"] = self.cost(configurations[candidate])
+            log_row["Decision"] = decisions[candidate]
+            log_row["Runs"] = list_of_trial_results[candidate].number_of_runs
+
+            for kpi in self.wait_targets:
+                if list_of_trial_results[candidate].number_of_runs == 0:
+                    log_row[kpi] = float("nan")
+                else:
+                    log_row[kpi] = list_of_trial_results[candidate].mean(kpi)
+
+            self.candidate_log.append(log_row)
+
+        if best_candidate == len(configurations):
+            return None
+
+        return configurations[best_candidate]
+
+    # A method that gives back a DataFrame of every mix we looked at, from
+    # the cheapest up
+    def summary(self):
+        return pd.DataFrame(self.candidate_log)
+
+# Example - find the cheapest staffing for the ED model from exercise 1 that
+# keeps the mean wait for ED assessment under 60 minutes and for ACU
+# assessment under 90 minutes, trying up to 2 receptionists, 3 nurses, 6 ED
+# doctors and 4 ACU doctors
+if __name__ == "__main__":
+    from exercise_1_solution import ED_Model, g
+    from scenario_engine import full_grid_design
+
+    configurations = full_grid_design(number_of_receptionists=[1, 2],
+                                      number_of_nurses=[1, 2, 3],
+                                      number_of_ed_doctors=list(range(1, 7)),
+                                      number_of_acu_doctors=[1, 2, 3, 4])
+    staff_costs = {"number_of_receptionists":25, "number_of_nurses":40,
+                   "number_of_ed_doctors":100, "number_of_acu_doctors":100}
+    wait_targets = {"Mean_Q_Time_ED_Assessment":60,
+                    "Mean_Q_Time_ACU_Assessment":90}
+
+    my_optimiser = Staffing_Optimiser(ED_Model, g, staff_costs, wait_targets,
+                                      base_seed=42)
+    best_configuration = my_optimiser.optimise(configurations)
+
+    with pd.option_context("display.width", 120,
+                           "display.max_columns", None,
+                           "display.max_rows", None):
+        print (my_optimiser.summary().round(2))
+
+    print ("Cheapest staffing meeting the targets : ", best_configuration,
+           sep="")
+    print ("Total runs used : ", my_optimiser.total_runs, " (a fixed ",
+           my_optimiser.max_runs_per_candidate, " runs of every mix would "
+           "need ", len(configurations) *
+           my_optimiser.max_runs_per_candidate, ")", sep="")
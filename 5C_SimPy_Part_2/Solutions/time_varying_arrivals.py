@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+# Class to hand out the times between arrivals when the arrival rate changes
+# over time (eg an ED that's much busier in the afternoon than at 4am, and
+# busier on a Monday than a Sunday).  We give it a table of the average number
+# of arrivals in each period (by default, each hour), eg 168 values for each
+# hour of the week.  The table repeats, so after the last period we go back to
+# the first.  Time 0 is the start of the first period.
+#
+# The arrivals follow a non-stationary Poisson process.  We make them by
+# "inversion" - we make arrivals with a rate of 1 per unit of time (which is
+# easy - the gaps are just exponential with a mean of 1), and then stretch
+# time so that each period holds its expected number of arrivals.  If we've
+# had 2.5 expected arrivals by the end of period 3, and 4.5 by the end of
+# period 4, then a rate-1 arrival at time 3.5 happens half way through period
+# 4.  Unlike thinning (making arrivals at the busiest rate, and throwing some
+# away), every random number we draw gives us an arrival.
+#
+# Like the Variate_Pool, the arrivals are worked out in large blocks with
+# NumPy, and handed out one at a time, so it can be used in exactly the same
+# way - sample() gives the time until the next arrival.
+class Time_Varying_Arrivals:
+    def __init__(self, rng, arrival_rates, period_length=60,
+                 block_size=4096):
+        self.rng = rng
+        self.rates = np.asarray(arrival_rates, dtype=np.float64)
+        self.period_length = period_length
+        self.block_size = block_size
+
+        if np.any(self.rates < 0) or self.rates.sum() <= 0:
+            raise ValueError("Arrival rates can't be negative, and at least "
+                             "one needs to be more than 0")
+
+        # The expected number of arrivals by the start of each period (and,
+        # in the last value, by the end of the table)
+        self.expected_arrivals = np.concatenate([[0.0],
+                                                 np.cumsum(self.rates)])
+        self.expected_arrivals_per_cycle = self.expected_arrivals[-1]
+        self.cycle_length = len(self.rates) * period_length
+
+        # How far we've got in rate-1 time, and the time of the last arrival
+        # we've worked out
+        self.unit_rate_time = 0.0
+        self.last_arrival_time = 0.0
+
+        self.values = []
+        self.position = 0
+
+    # A method to work out the next block of arrivals, and turn them into the
+    # gaps between arrivals
+    def refill(self):
+        unit_rate_arrival_times = self.unit_rate_time + np.cumsum(
+            self.rng.exponential(size=self.block_size))
+        self.unit_rate_time = unit_rate_arrival_times[-1]
+
+        # Work out which repeat of the table (cycle) each arrival is in, and
+        # how many expected arrivals into that cycle it is
+        cycles, expected_arrivals_into_cycle = np.divmod(
+            unit_rate_arrival_times, self.expected_arrivals_per_cycle)
+
+        # Find the period each arrival falls in (periods with a rate of 0 are
+        # skipped over, as nobody can arrive in them), and how far through
+        # that period it is
+        periods = np.searchsorted(self.expected_arrivals,
+                                  expected_arrivals_into_cycle,
+                                  side="right") - 1
+        periods = np.minimum(periods, len(self.rates) - 1)
+
+        proportion_through_period = (
+            (expected_arrivals_into_cycle - self.expected_arrivals[periods]) /
+            self.rates[periods])
+
+        arrival_times = (cycles * self.cycle_length +
+                         (periods + proportion_through_period) *
+                         self.period_length)
+
+        self.values = np.diff(arrival_times,
+                              prepend=self.last_arrival_time).tolist()
+        self.last_arrival_time = arrival_times[-1]
+        self.position = 0
+
+    # A method to get the time until the next arrival
+    def sample(self):
+        if self.position == len(self.values):
+            self.refill()
+
+        value = self.values[self.position]
+        self.position += 1
+
+        return value
+
+# Function to build a table of 168 hourly arrival rates (one for each hour of
+# the week, starting at midnight on Monday) from a daily pattern (24 values -
+# how busy each hour of the day is compared to the others) and a weekly
+# pattern (7 values - how busy each day is compared to the others).  The
+# table is scaled so that, on average over the week, patients arrive every
+# mean_inter_arrival_time minutes.  The result is a tuple, so it can be used
+# as a parameter value (eg in the g class).
+def weekly_arrival_profile(hour_of_day_pattern, day_of_week_pattern,
+                           mean_inter_arrival_time):
+    hour_of_day_pattern = np.asarray(hour_of_day_pattern, dtype=np.float64)
+    day_of_week_pattern = np.asarray(day_of_week_pattern, dtype=np.float64)
+
+    relative_rates = np.outer(day_of_week_pattern,
+                              hour_of_day_pattern).ravel()
+
+    mean_arrivals_per_hour = 60 / mean_inter_arrival_time
+    rates = relative_rates * mean_arrivals_per_hour / relative_rates.mean()
+
+    return tuple(rates.tolist())
+
+# Example - an ED that's quietest around 5am and busiest around midday, and
+# busiest on Mondays, with a patient every 8 minutes on average.  We run the
+# ED model from exercise 1 with this profile for a year, and compare the
+# average number of arrivals in each hour of the day with the profile.
+if __name__ == "__main__":
+    from exercise_1_solution import ED_Model, g
+    from run_parameters import Run_Parameters
+
+    hour_of_day_pattern = [0.5, 0.4, 0.35, 0.3, 0.3, 0.3, 0.4, 0.6, 0.9, 1.2,
+                           1.4, 1.5, 1.5, 1.45, 1.4, 1.4, 1.35, 1.3, 1.25,
+                           1.2, 1.1, 1.0, 0.8, 0.6]
+    day_of_week_pattern = [1.2, 1.05, 1.0, 1.0, 1.0, 0.85, 0.9]
+
+    arrival_rate_profile = weekly_arrival_profile(
+        hour_of_day_pattern, day_of_week_pattern, g.ed_inter)
+
+    params = Run_Parameters.from_class(
+        g, arrival_rate_profile=arrival_rate_profile,
+        number_of_ed_doctors=5, number_of_acu_doctors=3,
+        sim_duration=525600, warm_up_duration=0)
+
+    model = ED_Model(0, 42, params)
+    arrival_times = []
+
+    # Record the time each patient arrives, by wrapping the arrivals
+    original_sample = model.inter_arrival_times.sample
+
+    def sample_and_record():
+        arrival_times.append(model.env.now)
+
+        return original_sample()
+
+    model.inter_arrival_times.sample = sample_and_record
+    model.run()
+
+    hours_of_day = (np.array(arrival_times) // 60 % 24).astype(int)
+    days_simulated = 525600 / 1440
+    arrivals_per_hour = np.bincount(hours_of_day, minlength=24) / (
+        days_simulated)
+    expected_per_hour = np.array(arrival_rate_profile).reshape(7, 24).mean(
+        axis=0)
+
+    print ("Hour  Simulated  Expected")
+
+    for hour in range(24):
+        print ("{:>4}  {:>9.2f}  {:>8.2f}".format(
+            hour, arrivals_per_hour[hour], expected_per_hour[hour]))
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import math
+import pandas as pd
+from scipy import stats
+
+# Class to keep a running mean and variance of a stream of values, without
+# needing to keep the values themselves.  This uses Welford's method, which
+# updates the mean and the sum of squared differences from the mean each time
+# a new value comes in.  It gives the same answers as working them out from
+# the full list at the end, but doesn't suffer from the rounding errors you
+# can get by keeping a running sum of squares.
+#
+# Until there's at least one value, the mean (and so the standard deviation
+# and confidence interval) is NaN rather than 0, so a KPI with no values at
+# all (eg no ACU patients in any run) can't be mistaken for a real result.
+class Running_Statistics:
+    def __init__(self):
+        self.count = 0
+        self.mean = float("nan")
+        self.sum_of_squared_differences = 0.0
+
+    # A method to add a new value.  NaNs are skipped, in the same way Pandas
+    # skips them when calculating a mean (eg a run with no ACU patients)
+    def add(self, value):
+        if math.isnan(value):
+            return
+
+        self.count += 1
+
+        if self.count == 1:
+            self.mean = value
+            return
+
+        difference_from_old_mean = value - self.mean
+        self.mean += difference_from_old_mean / self.count
+        self.sum_of_squared_differences += (difference_from_old_mean *
+                                            (value - self.mean))
+
+    # The sample variance (we divide by count - 1, as Pandas does by default)
+    def variance(self):
+        if self.count < 2:
+            return float("nan")
+
+        return self.sum_of_squared_differences / (self.count - 1)
+
+    def standard_deviation(self):
+        return math.sqrt(self.variance())
+
+    # A method to calculate the half width of a confidence interval for the
+    # mean, using the t distribution (as we'll usually only have a small
+    # number of runs)
+    def half_width(self, confidence=0.95):
+        if self.count < 2:
+            return float("nan")
+
+        t_value = stats.t.ppf((1 + confidence) / 2, self.count - 1)
+
+        return t_value * self.standard_deviation() / math.sqrt(self.count)
+
+    def confidence_interval(self, confidence=0.95):
+        half_width = self.half_width(confidence)
+
+        return self.mean - half_width, self.mean + half_width
+
+# Class to collect the results of the runs in a trial as they come in.  It
+# keeps running statistics for each KPI (each result other than the run
+# number), so the trial mean and confidence interval are ready at any point
+# during the trial without re-reading anything.  The results of each run are
+# also kept, so they can be written to file in one go at the end if we want.
+class Trial_Results_Aggregator:
+    def __init__(self, run_column="Run"):
+        self.run_column = run_column
+        self.kpi_statistics = {}
+        self.list_of_run_results = []
+
+    # A method to add the results of a single run, given as a dictionary of
+    # KPI name to value (as returned by the run method of the model)
+    def add_run_results(self, run_results):
+        self.list_of_run_results.append(run_results)
+
+        for kpi, value in run_results.items():
+            if kpi == self.run_column:
+                continue
+
+            if kpi not in self.kpi_statistics:
+                self.kpi_statistics[kpi] = Running_Statistics()
+
+            self.kpi_statistics[kpi].add(value)
+
+    @property
+    def number_of_runs(self):
+        return len(self.list_of_run_results)
+
+    def mean(self, kpi):
+        return self.kpi_statistics[kpi].mean
+
+    def confidence_interval(self, kpi, confidence=0.95):
+        return self.kpi_statistics[kpi].confidence_interval(confidence)
+
+    # The half width of the confidence interval as a proportion of the mean
+    # (eg 0.05 means we know the mean to within +/- 5%)
+    def relative_half_width(self, kpi, confidence=0.95):
+        if kpi not in self.kpi_statistics:
+            return float("nan")
+
+        kpi_stats = self.kpi_statistics[kpi]
+
+        if kpi_stats.mean == 0:
+            return float("nan")
+
+        return kpi_stats.half_width(confidence) / abs(kpi_stats.mean)
+
+    # A method that returns a DataFrame with one row per KPI, giving the trial
+    # mean, standard deviation and confidence interval
+    def summary(self, confidence=0.95):
+        summary_rows = []
+
+        for kpi, kpi_stats in self.kpi_statistics.items():
+            lower, upper = kpi_stats.confidence_interval(confidence)
+
+            summary_rows.append({"KPI":kpi,
+                                 "Runs":kpi_stats.count,
+                                 "Mean":kpi_stats.mean,
+                                 "Std_Dev":kpi_stats.standard_deviation(),
+                                 "Lower_CI":lower,
+                                 "Upper_CI":upper})
+
+        return pd.DataFrame(summary_rows).set_index("KPI")
+
+    # A method that returns the results of each run as a DataFrame (one row
+    # per run, in run order)
+    def to_dataframe(self):
+        run_results_df = pd.DataFrame(self.list_of_run_results)
+
+        if self.run_column in run_results_df.columns:
+            run_results_df = run_results_df.sort_values(self.run_column)
+
+        return run_results_df.reset_index(drop=True)
+
+    # A method to write the results of every run to a single file.  If the
+    # filename ends in .parquet we write a Parquet file (which needs the
+    # pyarrow package), otherwise we write a csv file
+    def write_results(self, filename):
+        run_results_df = self.to_dataframe()
+
+        if filename.endswith(".parquet"):
+            run_results_df.to_parquet(filename, index=False)
+        else:
+            run_results_df.to_csv(filename, index=False)
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+import sys
+import numpy as np
+from run_parameters import Run_Parameters
+from trial_results_aggregator import Trial_Results_Aggregator
+from simulation_logger import set_up_worker_logging, simulation_logging_level
+
+# Function to create a list of seeds, one for each run of a trial.  We use
+# NumPy's SeedSequence to "spawn" a child seed for each run from a single
+# base seed.  Spawned seeds are designed to give statistically independent
+# streams of random numbers, which isn't guaranteed if we just used 1, 2, 3...
+# If no base seed is given, one is picked at random for us (and we hand it
+# back so the trial can be repeated exactly later on).
+def generate_run_seeds(number_of_runs, base_seed=None):
+    seed_sequence = np.random.SeedSequence(base_seed)
+
+    run_seeds = [int(child.generate_state(1)[0]) for child in
+                 seed_sequence.spawn(number_of_runs)]
+
+    return seed_sequence.entropy, run_seeds
+
+# Function that carries out a single run of a model.  This needs to sit at the
+# top level of the module (rather than inside the Trial_Runner class) so that
+# it can be sent across to the worker processes.  The model is given this
+# run's own seed, which it uses to set up its random number streams, so every
+# run gets its own random numbers, no matter which worker process it ends up
+# in, and any single run can be reproduced on its own.  If we pass in a set of
+# Run_Parameters, the model uses those rather than the values in its g class.
+def run_replication(model_class, run_number, seed, params=None):
+    model = model_class(run_number, seed, params)
+
+    return model.run()
+
+# Function to take a copy of the values in a model's g class (as they are
+# right now), as a set of Run_Parameters.  When we don't give a model any
+# parameters, we send this copy to the worker processes, rather than leaving
+# each worker to use its own g class.  A worker that's started from scratch
+# (as on Windows and macOS) imports g again, so it wouldn't see any changes
+# made to g whilst this program has been running.  If the model has no g
+# class, we give back None, and the model uses whatever it does by default.
+def snapshot_model_parameters(model_class):
+    model_module = sys.modules[model_class.__module__]
+
+    if not hasattr(model_module, "g"):
+        return None
+
+    return Run_Parameters.from_class(model_module.g)
+
+# Function to start a pool of worker processes for doing runs.  Each worker
+# is given the same logging as this process when it starts (see
+# simulation_logger.py), so switching the model's log messages on works for
+# runs done in the workers too.
+def start_worker_pool(max_workers):
+    return ProcessPoolExecutor(max_workers=max_workers,
+                               initializer=set_up_worker_logging,
+                               initargs=(simulation_logging_level(),))
+
+# Function to call a function once for each set of arguments, handing the
+# calls out to a pool of worker processes, and giving back the results (in the
+# same order as the arguments) as they come in.  The function needs to be
+# defined at the top level of a module so it can be sent to the workers.  If
+# we're going to call this lots of times, we can pass in a pool (executor)
+# that's already been started, rather than starting a new one each time.
+def map_runs(function, list_of_arguments, max_workers, executor=None):
+    # If we've only asked for one worker, just do the runs here, one after
+    # the other.  This saves the cost of starting a pool, and makes any
+    # errors in the model much easier to track down.
+    if max_workers == 1:
+        for arguments in list_of_arguments:
+            yield function(*arguments)
+
+        return
+
+    # Send the runs out in chunks, so each worker gets a few runs at a time
+    # rather than having to come back for every single one.  Four chunks per
+    # worker keeps the workers evenly loaded whilst keeping the overhead of
+    # passing runs back and forth low.
+    chunk_size = max(1, len(list_of_arguments) // (max_workers * 4))
+
+    if executor is not None:
+        for result in executor.map(function, *zip(*list_of_arguments),
+                                   chunksize=chunk_size):
+            yield result
+
+        return
+
+    with start_worker_pool(max_workers) as executor:
+        for result in executor.map(function, *zip(*list_of_arguments),
+                                   chunksize=chunk_size):
+            yield result
+
+# Function to do a list of runs of a model (each given as the arguments for
+# run_replication), giving back the results in the same order.  If we pass in
+# a Results_Cache, any runs it already has results for aren't run again, and
+# the results of the runs that are done are saved to it.  Any runs without
+# parameters are given a copy of the model's g class values, taken here, and
+# that same copy is used both to do the run and to find it in the cache, so
+# the two can never disagree.
+def map_replications(list_of_arguments, max_workers, executor=None,
+                     cache=None):
+    snapshots = {}
+
+    for model_class, run_number, seed, params in list_of_arguments:
+        if params is None and model_class not in snapshots:
+            snapshots[model_class] = snapshot_model_parameters(model_class)
+
+    list_of_arguments = [
+        (model_class, run_number, seed,
+         snapshots[model_class] if params is None else params)
+        for model_class, run_number, seed, params in list_of_arguments]
+
+    if cache is None:
+        for run_results in map_runs(run_replication, list_of_arguments,
+                                    max_workers, executor):
+            yield run_results
+
+        return
+
+    cached_results = [cache.load(*arguments)
+                      for arguments in list_of_arguments]
+    arguments_to_run = [arguments for arguments, run_results in
+                        zip(list_of_arguments, cached_results)
+                        if run_results is None]
+
+    new_results = map_runs(run_replication, arguments_to_run, max_workers,
+                           executor) if arguments_to_run else iter([])
+
+    for arguments, run_results in zip(list_of_arguments, cached_results):
+        if run_results is None:
+            run_results = next(new_results)
+            cache.save(*arguments, run_results)
+
+        yield run_results
+
+# Class to run a trial (a batch of runs) of a model.  Rather than running one
+# run after another, it hands the runs out to a pool of worker processes (by
+# default, one per CPU core), so the trial finishes in roughly 1 / (number of
+# cores) of the time.  The model class we pass in needs to take a run number
+# and a seed when it's created, and have a run method that returns a
+# dictionary of results for that run.  If we're going to use
+# run_until_precision (below), we don't need to give a number of runs.  If we
+# give a set of Run_Parameters, every run uses those, otherwise every run uses
+# a copy of the values in the model's g class, taken when the trial runner is
+# set up (so changing g afterwards doesn't change the trial).
+#
+# If we give a checkpoint file, the results of each run are written to it as
+# soon as the run finishes.  If the trial is stopped partway through (eg the
+# computer crashes during a trial of year-long runs), running it again with
+# the same checkpoint file picks up the runs that had finished, and only does
+# the rest.  Each run still gets the same seed, so the results are the same as
+# if the trial had never been stopped.  We can't save a run partway through
+# (SimPy's processes are paused Python generators, which can't be saved to
+# disk), so a run that was stopped partway is done again from the start.
+#
+# If we give a Results_Cache (see results_cache.py), any run that's been done
+# before - with the same model code, parameters and seed, in this trial or
+# any other - is taken from the cache rather than being run again.
+class Trial_Runner:
+    def __init__(self, model_class, number_of_runs=None, base_seed=None,
+                 max_workers=None, params=None, checkpoint_file=None,
+                 cache=None):
+        self.model_class = model_class
+        self.number_of_runs = number_of_runs
+
+        if params is None:
+            params = snapshot_model_parameters(model_class)
+
+        self.params = params
+        self.checkpoint_file = checkpoint_file
+        self.cache = cache
+
+        if max_workers is None:
+            max_workers = os.cpu_count()
+
+        self.max_workers = max_workers
+
+        self.base_seed_given = base_seed is not None
+        self.base_seed, self.run_seeds = generate_run_seeds(
+            number_of_runs or 0, base_seed)
+
+    # A method to run all of the runs in the trial.  The results of each run
+    # are passed to a Trial_Results_Aggregator as soon as they come back from
+    # the workers, and the aggregator is returned at the end
+    def run_trial(self):
+        trial_results = Trial_Results_Aggregator()
+
+        completed_runs = self.load_checkpoint()
+
+        for run in sorted(completed_runs):
+            if run < len(self.run_seeds):
+                trial_results.add_run_results(completed_runs[run])
+
+        list_of_arguments = [(self.model_class, run, seed, self.params)
+                             for run, seed in enumerate(self.run_seeds)
+                             if run not in completed_runs]
+
+        for run_results in map_replications(list_of_arguments,
+                                            self.max_workers,
+                                            cache=self.cache):
+            trial_results.add_run_results(run_results)
+            self.save_checkpoint(run_results)
+
+        return trial_results
+
+    # A method to keep running batches of runs until we're confident enough
+    # in the results, rather than doing a fixed number of runs.  We give it a
+    # target precision for each KPI we care about, as a proportion of the
+    # mean - eg {"Mean_Q_Time_ED_Assessment":0.05} means we want the 95%
+    # confidence interval to be no wider than the mean +/- 5%.  After each
+    # batch (by default, enough runs to keep every worker busy twice over,
+    # and never fewer than 10), we check the confidence intervals, and stop as
+    # soon as every target is met, or we hit max_runs.  The number of runs
+    # used is stored in number_of_runs, and whether we met the targets in
+    # precision_met.
+    #
+    # Run i is always given the same seed as run i of a fixed trial with the
+    # same base seed, so the runs done here are the first runs of that trial.
+    def run_until_precision(self, target_precision, batch_size=None,
+                            max_runs=1000, confidence=0.95):
+        if batch_size is None:
+            batch_size = max(10, 2 * self.max_workers)
+
+        self.base_seed, self.run_seeds = generate_run_seeds(max_runs,
+                                                            self.base_seed)
+
+        trial_results = Trial_Results_Aggregator()
+
+        # Start with any runs we've already done (if we're carrying on from a
+        # checkpoint), and work out which runs are left
+        completed_runs = self.load_checkpoint()
+
+        for run in sorted(completed_runs):
+            if run < max_runs:
+                trial_results.add_run_results(completed_runs[run])
+
+        remaining_runs = [run for run in range(max_runs)
+                          if run not in completed_runs]
+
+        if self.max_workers == 1:
+            executor = None
+        else:
+            executor = start_worker_pool(self.max_workers)
+
+        try:
+            while remaining_runs and not self.targets_met(
+                    trial_results, target_precision, confidence):
+                list_of_arguments = [
+                    (self.model_class, run, self.run_seeds[run], self.params)
+                    for run in remaining_runs[:batch_size]]
+                remaining_runs = remaining_runs[batch_size:]
+
+                for run_results in map_replications(list_of_arguments,
+                                                    self.max_workers,
+                                                    executor, self.cache):
+                    trial_results.add_run_results(run_results)
+                    self.save_checkpoint(run_results)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        self.precision_met = self.targets_met(trial_results,
+                                              target_precision, confidence)
+        self.number_of_runs = trial_results.number_of_runs
+
+        return trial_results
+
+    # A method to read the runs that have already been done from the
+    # checkpoint file, giving back a dictionary of their results keyed by run
+    # number.  The first line of the file describes the trial (the model, the
+    # base seed and the parameters), so we don't carry on from a checkpoint
+    # of a different trial by mistake.  If we didn't give a base seed, we
+    # take the one from the checkpoint, so the remaining runs get the seeds
+    # they would have had.  If there's no checkpoint file yet, we start one.
+    def load_checkpoint(self):
+        if self.checkpoint_file is None:
+            return {}
+
+        trial_description = {"Model":self.model_class.__module__ + "." +
+                             self.model_class.__qualname__,
+                             "Base_Seed":self.base_seed,
+                             "Params":repr(self.params)}
+
+        if not os.path.exists(self.checkpoint_file):
+            with open(self.checkpoint_file, "w") as checkpoint:
+                checkpoint.write(json.dumps(trial_description) + "\n")
+
+            return {}
+
+        with open(self.checkpoint_file) as checkpoint:
+            lines = checkpoint.read().splitlines()
+
+        saved_description = json.loads(lines[0])
+
+        if saved_description["Base_Seed"] != self.base_seed:
+            if self.base_seed_given:
+                raise ValueError("The checkpoint file " +
+                                 self.checkpoint_file + " is for a trial "
+                                 "with a different base seed")
+
+            self.base_seed, self.run_seeds = generate_run_seeds(
+                len(self.run_seeds), saved_description["Base_Seed"])
+            trial_description["Base_Seed"] = self.base_seed
+
+        if saved_description != trial_description:
+            raise ValueError("The checkpoint file " + self.checkpoint_file +
+                             " is for a different model or parameters")
+
+        completed_runs = {}
+
+        for line in lines[1:]:
+            # If the trial was stopped whilst a run was being written, the
+            # last line will only be partly there, so we leave it out (and
+            # the run is done again)
+            try:
+                run_results = json.loads(line)
+            except ValueError:
+                continue
+
+            completed_runs[run_results["Run"]] = run_results
+
+        # Write the file back out without any partly written line, so the
+        # runs we add next start on a line of their own
+        with open(self.checkpoint_file, "w") as checkpoint:
+            checkpoint.write(json.dumps(trial_description) + "\n")
+
+            for run in sorted(completed_runs):
+                checkpoint.write(json.dumps(completed_runs[run]) + "\n")
+
+        return completed_runs
+
+    # A method to add the results of a run to the checkpoint file.  We flush
+    # the file straight away, so the run is saved even if the trial is
+    # stopped just afterwards.
+    def save_checkpoint(self, run_results):
+        if self.checkpoint_file is None:
+            return
+
+        with open(self.checkpoint_file, "a") as checkpoint:
+            checkpoint.write(json.dumps(run_results) + "\n")
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+
+    # A method to check whether the confidence interval for each KPI is
+    # within its target precision.  If a KPI's interval can't be worked out
+    # yet (eg fewer than 2 runs, or a mean of 0), we count it as not met.
+    def targets_met(self, trial_results, target_precision, confidence):
+        for kpi, target in target_precision.items():
+            relative_half_width = trial_results.relative_half_width(
+                kpi, confidence)
+
+            if not relative_half_width <= target:
+                return False
+
+        return True
+
+# Example - run the ED model from exercise 1 until we know the mean queuing
+# time for ED assessment to within +/- 5% and for ACU assessment to within
+# +/- 10%
+if __name__ == "__main__":
+    from exercise_1_solution import ED_Model
+
+    my_trial_runner = Trial_Runner(ED_Model)
+
+    trial_results = my_trial_runner.run_until_precision(
+        {"Mean_Q_Time_ED_Assessment":0.05,
+         "Mean_Q_Time_ACU_Assessment":0.1})
+
+    print ("Runs used : ", my_trial_runner.number_of_runs,
+           " (precision met : ", my_trial_runner.precision_met, ")", sep="")
+    print (trial_results.summary().round(2))
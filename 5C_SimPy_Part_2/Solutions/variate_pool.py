@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Class to hand out random samples from a distribution one at a time, whilst
+# drawing them from NumPy in large blocks behind the scenes.  Asking a NumPy
+# generator for one number at a time is slow (each call has a fixed cost that
+# is much bigger than the cost of making the number), but asking it for
+# thousands at once costs barely more than asking for one.  So the pool asks
+# for a block of samples, hands them out until they've all gone, and then asks
+# for another block.
+#
+# We tell the pool which generator to use, the name of the NumPy distribution
+# method (eg "exponential") and the distribution's parameters (eg scale=30).
+# As each pool has its own generator (one of the model's random number
+# streams), the samples it hands out are exactly the same from one run of the
+# same seed to the next.
+class Variate_Pool:
+    def __init__(self, rng, distribution, block_size=4096, **parameters):
+        self.sample_block = getattr(rng, distribution)
+        self.block_size = block_size
+        self.parameters = parameters
+
+        # We don't draw the first block until the first sample is asked for,
+        # so a pool that's never used costs nothing
+        self.values = []
+        self.position = 0
+
+    # A method to draw a new block of samples.  We turn the block into a
+    # normal Python list, as picking single items out of a list is much
+    # quicker than picking them out of a NumPy array
+    def refill(self):
+        self.values = self.sample_block(size=self.block_size,
+                                        **self.parameters).tolist()
+        self.position = 0
+
+    # A method to get the next sample from the pool
+    def sample(self):
+        if self.position == len(self.values):
+            self.refill()
+
+        value = self.values[self.position]
+        self.position += 1
+
+        return value
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import numpy as np
+import pandas as pd
+from run_parameters import Run_Parameters
+from trial_runner import generate_run_seeds, map_runs
+
+# Function that carries out a single pilot run of a model, with no warm up
+# period, and returns the mean of each KPI for each time interval (bin) of the
+# run - eg the mean queuing time for triage of patients who finished in each
+# hour.  This is worked out in the worker, so we only need to send back one
+# number per bin rather than every patient.  The model's results_df needs a
+# Time_Completed column, giving the time each patient finished.
+def run_pilot_replication(model_class, params, kpis, bin_width, run_number,
+                          seed):
+    model = model_class(run_number, seed, params)
+    model.run()
+
+    patient_results_df = model.results_df
+
+    bins = (patient_results_df["Time_Completed"] // bin_width).astype(int)
+
+    return patient_results_df[list(kpis)].groupby(bins).mean()
+
+# Function to carry out the MSER (Marginal Standard Error Rule) on a series of
+# values.  We first average the series in batches (eg MSER-5 uses batches of
+# 5).  Then, for each number of batches d we could throw away from the start
+# (up to half of them), we work out how much uncertainty there'd be in the
+# mean of what's left - the sum of squared differences from the mean of the
+# remaining batches, divided by the number remaining squared.  Throwing away
+# the biased start reduces this, but throwing away too much increases it
+# again, as we've got less data left.  We pick the d with the lowest value,
+# and return the number of values (not batches) to throw away.  Any NaNs are
+# left out, so a series with gaps in it needs them filled in first (see
+# find_warm_up_period) for the number returned to match its positions.
+def mser_truncation_point(series, batch_size=5):
+    values = np.asarray(series, dtype=np.float64)
+    values = values[~np.isnan(values)]
+
+    number_of_batches = len(values) // batch_size
+
+    if number_of_batches < 2:
+        return 0
+
+    batch_means = values[:number_of_batches * batch_size].reshape(
+        number_of_batches, batch_size).mean(axis=1)
+
+    mser_values = []
+
+    for d in range(number_of_batches // 2 + 1):
+        remaining_batches = batch_means[d:]
+        mser_values.append(
+            np.sum((remaining_batches - remaining_batches.mean()) ** 2) /
+            len(remaining_batches) ** 2)
+
+    return int(np.argmin(mser_values)) * batch_size
+
+# Class to find how long a warm up period a model needs.  It does a number of
+# pilot runs of the model, with no warm up period and a longer run length than
+# usual, and records the mean of each KPI in each time interval (bin) of each
+# run.  Averaging each bin over the pilot runs gives us a single, smoother
+# series for each KPI (this is Welch's method - plot these to see how long
+# the model takes to settle down).  We then run MSER-5 on each series to
+# find where the start-up bias ends, and take the latest of these as the
+# warm up period.
+#
+# Note that this only makes sense for models that do settle down - if a queue
+# keeps on growing (eg not enough doctors for the number of patients), there
+# isn't a warm up period to find, however long we wait.
+class Warm_Up_Analysis:
+    def __init__(self, model_class, parameter_class,
+                 kpis=("Q_Time_Registration", "Q_Time_Triage",
+                       "Q_Time_ED_Assessment", "Q_Time_ACU_Assessment"),
+                 number_of_pilot_runs=10, pilot_duration=None, bin_width=60,
+                 batch_size=5, scenario=None, base_seed=None,
+                 max_workers=None):
+        self.model_class = model_class
+        self.parameter_class = parameter_class
+        self.kpis = list(kpis)
+        self.number_of_pilot_runs = number_of_pilot_runs
+        self.bin_width = bin_width
+        self.batch_size = batch_size
+
+        # By default, the pilot runs are three times as long as a normal run
+        # (including its warm up)
+        if pilot_duration is None:
+            pilot_duration = 3 * (parameter_class.sim_duration +
+                                  parameter_class.warm_up_duration)
+
+        self.pilot_duration = pilot_duration
+
+        # The pilot runs use any scenario values we've given, but with no
+        # warm up, and the pilot run length
+        self.scenario = dict(scenario or {})
+
+        pilot_scenario = dict(self.scenario)
+        pilot_scenario["warm_up_duration"] = 0
+        pilot_scenario["sim_duration"] = pilot_duration
+
+        self.pilot_params = Run_Parameters.from_class(parameter_class,
+                                                      **pilot_scenario)
+
+        if max_workers is None:
+            max_workers = os.cpu_count()
+
+        self.max_workers = max_workers
+
+        self.base_seed, self.run_seeds = generate_run_seeds(
+            number_of_pilot_runs, base_seed)
+
+        self.welch_averages_df = None
+        self.truncation_points = {}
+        self.warm_up_period = None
+
+    # A method to do the pilot runs and work out the average of each KPI in
+    # each bin over the pilot runs.  The result is a DataFrame with one row per
+    # bin (indexed by the time at the start of the bin) and one column per KPI
+    def run_pilots(self):
+        list_of_arguments = [(self.model_class, self.pilot_params, self.kpis,
+                              self.bin_width, run, seed)
+                             for run, seed in enumerate(self.run_seeds)]
+
+        list_of_binned_results = list(map_runs(run_pilot_replication,
+                                               list_of_arguments,
+                                               self.max_workers))
+
+        # Line the runs up by bin, and average each bin over the runs
+        self.welch_averages_df = pd.concat(list_of_binned_results).groupby(
+            level=0).mean()
+
+        # Make sure every bin is there, even if no-one finished in that bin in
+        # any run (eg very early on), and label the bins with their start times
+        all_bins = range(int(self.pilot_duration // self.bin_width))
+        self.welch_averages_df = self.welch_averages_df.reindex(all_bins)
+        self.welch_averages_df.index = (self.welch_averages_df.index *
+                                        self.bin_width)
+        self.welch_averages_df.index.name = "Time"
+
+        return self.welch_averages_df
+
+    # A method to find the warm up period (in simulation time units).  It does
+    # the pilot runs if they haven't been done yet.  The truncation point
+    # found for each KPI is kept in truncation_points.
+    def find_warm_up_period(self):
+        if self.welch_averages_df is None:
+            self.run_pilots()
+
+        for kpi in self.kpis:
+            series = self.welch_averages_df[kpi]
+
+            # Bins at the start with no patients can't tell us anything, so
+            # MSER starts from the first bin with a value in it, and we add
+            # the empty bins on afterwards
+            first_valid_bin = int(series.notna().values.argmax())
+
+            # Any empty bins after that are filled in from the bins either
+            # side of them (or the last bin with a value, at the end), rather
+            # than left out - MSER counts bins, so leaving some out would
+            # make every later bin look earlier than it was
+            series = series.iloc[first_valid_bin:].interpolate().ffill()
+
+            truncated_bins = mser_truncation_point(series.values,
+                                                   self.batch_size)
+
+            self.truncation_points[kpi] = ((first_valid_bin + truncated_bins) *
+                                           self.bin_width)
+
+        self.warm_up_period = max(self.truncation_points.values())
+
+        return self.warm_up_period
+
+    # A method to feed the warm up period we've found back into the model.  We
+    # give back a set of Run_Parameters - the values in the parameter class,
+    # with any scenario values we gave, and the warm up period we've found -
+    # to pass to a Trial_Runner or Scenario_Engine (as params).  We don't
+    # change the parameter class itself, as the change would only be seen in
+    # this process - worker processes that are started from scratch (as on
+    # Windows and macOS) import the parameter class again, and would never
+    # see the new warm up period.
+    def apply_warm_up_period(self):
+        if self.warm_up_period is None:
+            self.find_warm_up_period()
+
+        base_params = Run_Parameters.from_class(self.parameter_class,
+                                                **self.scenario)
+
+        return base_params.replace(warm_up_duration=self.warm_up_period)
+
+# Example - find the warm up period for the ED model from exercise 1, with
+# enough doctors that the queues settle down, and then run a trial of the
+# model using that warm up period
+if __name__ == "__main__":
+    from exercise_1_solution import g, ED_Model
+    from trial_runner import Trial_Runner
+
+    my_warm_up_analysis = Warm_Up_Analysis(
+        ED_Model, g, number_of_pilot_runs=20,
+        scenario={"number_of_ed_doctors":4, "number_of_acu_doctors":2})
+
+    warm_up_period = my_warm_up_analysis.find_warm_up_period()
+
+    print ("Truncation point for each KPI : ",
+           my_warm_up_analysis.truncation_points, sep="")
+    print ("Warm up period : ", warm_up_period, " (currently ",
+           g.warm_up_duration, ")", sep="")
+
+    warmed_up_params = my_warm_up_analysis.apply_warm_up_period()
+
+    my_trial_runner = Trial_Runner(ED_Model, g.number_of_runs,
+                                   params=warmed_up_params)
+    trial_results = my_trial_runner.run_trial()
+
+    print ()
+    print ("Trial of ", g.number_of_runs, " runs with a warm up period of ",
+           warmed_up_params.warm_up_duration, sep="")
+    print (trial_results.summary().round(2))
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Benchmarks for the SimPy ED model family :
+#   - 5A_Discrete_Event_Simulation/Lecture_Examples/simple_simpy.py
+#   - 5C_SimPy_Part_2/Solutions/simpy_oo_priority_resource.py (with and
+#     without preemptive doctors)
+#   - 5C_SimPy_Part_2/Solutions/simpy_oo_unavailability.py
+#   - 1_Introduction_to_OR_and_Data_Science/how_long_spend_ed.py
+#
+# Each model is run for a range of run lengths (horizons) and arrival rates,
+# and for each we report the wall time, the number of SimPy events processed
+# per second, the number of patients per second and the peak memory used.
+#
+# Each case is run twice over.  First we time it (taking the quickest of a
+# few repeats, as the quickest is the one least affected by whatever else the
+# computer was doing).  Then we run it once more to count the events and
+# patients and measure the peak memory - counting and measuring memory slow
+# the model down, so we don't time this run.
+#
+# The results can be saved as a baseline (with --save-baseline), and later
+# runs are compared against it - if a case is slower, or uses more memory,
+# than its baseline by more than the tolerance, it's flagged as a regression
+# (and the script exits with an error, so it can be used in automatic
+# checks).  Timings depend on the computer, so a baseline is only meaningful
+# on the computer it was saved on.  The baseline file is therefore never
+# committed (it's in .gitignore) - each computer saves its own with
+# --save-baseline, and until it has, there's nothing to compare against and
+# no case can be flagged.  Save a new baseline whenever the models change on
+# purpose (eg a new feature that's expected to be slower).
+#
+# Examples :
+#   python ed_model_benchmarks.py
+#   python ed_model_benchmarks.py --save-baseline
+#   python ed_model_benchmarks.py --models how_long_spend_ed --repeats 5
+
+import argparse
+import contextlib
+import importlib.util
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+import simpy
+
+REPO_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(
+    __file__)), "baselines.json")
+
+# Run lengths (in simulated minutes) - a day, a week and four weeks - and
+# multipliers on each model's usual arrival rate (eg 2.0 means patients
+# arrive twice as often)
+DEFAULT_HORIZONS = [1440, 10080, 40320]
+DEFAULT_ARRIVAL_RATES = [1.0, 2.0]
+
+# Function to import a model file from anywhere in the repository.  The
+# model's folder is added to the path first, so any files it imports from its
+# own folder (eg run_parameters.py) can be found.
+def load_model_module(relative_path):
+    path = os.path.join(REPO_FOLDER, relative_path)
+    folder = os.path.dirname(path)
+
+    if folder not in sys.path:
+        sys.path.insert(0, folder)
+
+    module_name = os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+# Functions to do a single run of each model, for a given horizon and arrival
+# rate multiplier.  The two script models use Python's random module, so we
+# seed that; the ED_Model classes take their seed directly.
+def run_simple_simpy(module, horizon, arrival_rate, seed):
+    random.seed(seed)
+    module.run_weight_loss_clinic(run_duration=horizon,
+                                  wl_inter=5 / arrival_rate)
+
+def run_how_long_spend_ed(module, horizon, arrival_rate, seed):
+    random.seed(seed)
+    module.run_ed_simulation(run_duration=horizon,
+                             mean_interarrival_time=8 / arrival_rate)
+
+def run_ed_model(module, horizon, arrival_rate, seed, **changes):
+    from run_parameters import Run_Parameters
+
+    params = Run_Parameters.from_class(module.g, sim_duration=horizon,
+                                       warm_up_duration=0,
+                                       ed_inter=module.g.ed_inter /
+                                       arrival_rate, **changes)
+    module.ED_Model(0, seed, params).run()
+
+# The priority resource model again, but with preemptive doctors, so we can
+# see how much handling interruptions costs compared to the non-preemptive
+# version
+def run_preemptive_ed_model(module, horizon, arrival_rate, seed):
+    run_ed_model(module, horizon, arrival_rate, seed,
+                 preemptive_doctors=True)
+
+# The models we can benchmark - the file to load, the function that runs it,
+# and the number of SimPy processes each run starts that aren't patients (eg
+# the arrivals generator), which we take off the number of processes started
+# to get the number of patients
+MODELS = {
+    "simple_simpy":(
+        "5A_Discrete_Event_Simulation/Lecture_Examples/simple_simpy.py",
+        run_simple_simpy, 1),
+    "simpy_oo_priority_resource":(
+        "5C_SimPy_Part_2/Solutions/simpy_oo_priority_resource.py",
+        run_ed_model, 1),
+    "simpy_oo_priority_resource_preemptive":(
+        "5C_SimPy_Part_2/Solutions/simpy_oo_priority_resource.py",
+        run_preemptive_ed_model, 1),
+    "simpy_oo_unavailability":(
+        "5C_SimPy_Part_2/Solutions/simpy_oo_unavailability.py",
+        run_ed_model, 1),
+    "how_long_spend_ed":(
+        "1_Introduction_to_OR_and_Data_Science/how_long_spend_ed.py",
+        run_how_long_spend_ed, 1),
+    }
+
+# Context manager that counts every event SimPy processes, and every process
+# that's started, by wrapping the step method of the SimPy environment and
+# the set up of SimPy's Process class.  The counts are put in the dictionary
+# we pass in.
+@contextlib.contextmanager
+def counting_simpy_activity(counts):
+    original_step = simpy.Environment.step
+    original_process_init = simpy.events.Process.__init__
+
+    def counting_step(env):
+        counts["events"] += 1
+        return original_step(env)
+
+    def counting_process_init(process, env, generator):
+        counts["processes"] += 1
+        original_process_init(process, env, generator)
+
+    simpy.Environment.step = counting_step
+    simpy.events.Process.__init__ = counting_process_init
+
+    try:
+        yield counts
+    finally:
+        simpy.Environment.step = original_step
+        simpy.events.Process.__init__ = original_process_init
+
+# Function to benchmark a single model for a single horizon and arrival rate.
+# Anything the model prints is thrown away, so we're not timing the printing.
+def benchmark_case(model_name, horizon, arrival_rate, repeats=3, seed=42):
+    relative_path, run_function, background_processes = MODELS[model_name]
+
+    with open(os.devnull, "w") as devnull:
+        with contextlib.redirect_stdout(devnull):
+            module = load_model_module(relative_path)
+
+            wall_times = []
+
+            for repeat in range(repeats):
+                start_time = time.perf_counter()
+                run_function(module, horizon, arrival_rate, seed)
+                wall_times.append(time.perf_counter() - start_time)
+
+            counts = {"events":0, "processes":0}
+
+            tracemalloc.start()
+
+            with counting_simpy_activity(counts):
+                run_function(module, horizon, arrival_rate, seed)
+
+            current_memory, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+    wall_time = min(wall_times)
+    patients = counts["processes"] - background_processes
+
+    return {"Model":model_name,
+            "Horizon":horizon,
+            "Arrival_Rate":arrival_rate,
+            "Wall_Time_s":wall_time,
+            "Events":counts["events"],
+            "Events_per_s":counts["events"] / wall_time,
+            "Patients":patients,
+            "Patients_per_s":patients / wall_time,
+            "Peak_Memory_MB":peak_memory / 1024 ** 2}
+
+def case_key(case_results):
+    return (case_results["Model"] + "|" + str(case_results["Horizon"]) + "|" +
+            str(case_results["Arrival_Rate"]))
+
+# Function to compare the results of each case with its baseline.  A case has
+# regressed if its wall time or peak memory is more than the tolerance (as a
+# proportion - eg 0.25 is 25%) above its baseline.  We give back a list of
+# descriptions of each regression (which is empty if there weren't any).
+def find_regressions(list_of_case_results, baselines, tolerance):
+    regressions = []
+
+    for case_results in list_of_case_results:
+        baseline = baselines.get(case_key(case_results))
+
+        if baseline is None:
+            continue
+
+        for measure in ["Wall_Time_s", "Peak_Memory_MB"]:
+            limit = baseline[measure] * (1 + tolerance)
+
+            if case_results[measure] > limit:
+                regressions.append(
+                    case_key(case_results) + " : " + measure + " " +
+                    str(round(case_results[measure], 4)) + " vs baseline " +
+                    str(round(baseline[measure], 4)))
+
+    return regressions
+
+def print_results_table(list_of_case_results, baselines):
+    columns = ["Model", "Horizon", "Arrival_Rate", "Wall_Time_s",
+               "Events_per_s", "Patients_per_s", "Peak_Memory_MB"]
+
+    print ("{:<40}{:>8}{:>14}{:>13}{:>14}{:>16}{:>16}{:>9}".format(
+        *(columns + ["vs_Base"])))
+
+    for case_results in list_of_case_results:
+        baseline = baselines.get(case_key(case_results))
+
+        if baseline is None:
+            speed_change = "-"
+        else:
+            speed_change = "{:+.0%}".format(
+                baseline["Wall_Time_s"] / case_results["Wall_Time_s"] - 1)
+
+        print ("{:<40}{:>8}{:>14}{:>13.3f}{:>14,.0f}{:>16,.0f}{:>16.2f}{:>9}"
+               .format(*([case_results[column] for column in columns] +
+                         [speed_change])))
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the SimPy ED model family")
+    parser.add_argument("--models", nargs="+", choices=list(MODELS),
+                        default=list(MODELS))
+    parser.add_argument("--horizons", nargs="+", type=int,
+                        default=DEFAULT_HORIZONS)
+    parser.add_argument("--arrival-rates", nargs="+", type=float,
+                        default=DEFAULT_ARRIVAL_RATES)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--baseline-file", default=DEFAULT_BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="save these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="how much worse than the baseline (as a "
+                        "proportion) a case can be before it's a regression")
+    options = parser.parse_args(arguments)
+
+    list_of_case_results = []
+
+    for model_name in options.models:
+        for horizon in options.horizons:
+            for arrival_rate in options.arrival_rates:
+                list_of_case_results.append(benchmark_case(
+                    model_name, horizon, arrival_rate, options.repeats,
+                    options.seed))
+
+    baselines = {}
+
+    if os.path.exists(options.baseline_file):
+        with open(options.baseline_file) as baseline_file:
+            baselines = json.load(baseline_file)
+    elif not options.save_baseline:
+        print ("No baseline found at ", options.baseline_file, " - run with "
+               "--save-baseline to save one for this computer", sep="")
+
+    print_results_table(list_of_case_results, baselines)
+
+    if options.save_baseline:
+        for case_results in list_of_case_results:
+            baselines[case_key(case_results)] = case_results
+
+        with open(options.baseline_file, "w") as baseline_file:
+            json.dump(baselines, baseline_file, indent=2, sort_keys=True)
+
+        print ("Baseline saved to ", options.baseline_file, sep="")
+
+        return 0
+
+    regressions = find_regressions(list_of_case_results, baselines,
+                                   options.tolerance)
+
+    if regressions:
+        print ("PERFORMANCE REGRESSIONS")
+        print ("-----------------------")
+
+        for regression in regressions:
+            print (regression)
+
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())